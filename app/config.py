@@ -1,4 +1,5 @@
 import os
+import socket
 import logging
 from dotenv import load_dotenv
 
@@ -16,18 +17,122 @@ REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
 REDIS_DB = int(os.getenv("REDIS_DB", 0))
 REDIS_TTL = int(os.getenv("REDIS_TTL", 60 * 60 * 24 * 7))  # Default 7 days
 CACHE_TTL = int(os.getenv("CACHE_TTL", 60 * 60 * 24))  # Cache responses for 24 hours
+CONVERSATION_MAX_MESSAGES = int(os.getenv("CONVERSATION_MAX_MESSAGES", 200))  # Older messages are trimmed server-side
+CONVERSATION_HISTORY_MESSAGES = int(os.getenv("CONVERSATION_HISTORY_MESSAGES", 4))  # Messages included as prompt history
+CACHE_SCHEMA_VERSION = os.getenv("CACHE_SCHEMA_VERSION", "v1")  # Bump to invalidate every cached response
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95))  # Min cosine similarity to reuse an answer
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 5000))
+STREAM_REPLAY_CHUNK_SIZE = int(os.getenv("STREAM_REPLAY_CHUNK_SIZE", 48))  # Characters per replayed SSE chunk
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", 60 * 60 * 24 * 30))  # Query embeddings for 30 days
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"  # Coalesce identical in-flight queries
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", 60))  # Max seconds a follower waits on its leader
+SINGLE_FLIGHT_RELAY_INTERVAL = float(os.getenv("SINGLE_FLIGHT_RELAY_INTERVAL", 0.1))  # Seconds of leader chunks batched per cross-worker relay
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", 10000))  # Deferred writes held in memory per worker
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 200))  # Writes per pipelined flush
+METRICS_PUSH_INTERVAL = float(os.getenv("METRICS_PUSH_INTERVAL", 10))  # Seconds between per-worker metrics snapshots
+METRICS_STALE_AFTER = float(os.getenv("METRICS_STALE_AFTER", 300))  # Drop snapshots of workers silent this long
+USAGE_WORKER_TTL = int(os.getenv("USAGE_WORKER_TTL", 60 * 60 * 24))  # Per-worker token counters outlive an idle worker by a day
 
 # === Pinecone Configuration ===
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "2025-judgements-index")
 
+# === Retrieval Configuration ===
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")  # "pinecone" or "local" (memory-mapped snapshot)
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "data/judgements-index")  # Snapshot dir for the local backend
+CITATION_INDEX_PATH = os.getenv("CITATION_INDEX_PATH", LOCAL_INDEX_PATH)  # Snapshot the lexical citation index is built from
+CITATION_MIN_COVERAGE = float(os.getenv("CITATION_MIN_COVERAGE", 0.6))  # Share of query terms a lexical hit must match
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 4096))  # In-process LRU entries per worker
+VECTOR_SEARCH_WORKERS = int(os.getenv("VECTOR_SEARCH_WORKERS", 8))  # Max concurrent blocking vector calls per worker
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", 3))  # Chunks handed to context packing
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", 12))  # Candidates fetched (with vectors) per search for reranking
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", 0.7))  # 1.0 = pure relevance, lower favours diversity
+MAX_CHUNKS_PER_JUDGMENT = int(os.getenv("MAX_CHUNKS_PER_JUDGMENT", 2))  # Per-judgment cap on selected chunks (0 = off)
+FUSION_VARIANTS = int(os.getenv("FUSION_VARIANTS", 3))  # LLM rephrasings searched alongside the original query
+RRF_K = int(os.getenv("RRF_K", 60))  # Reciprocal-rank fusion smoothing constant
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 600))  # Retrieved-context tokens packed into a prompt
+CONTEXT_TOKEN_BUDGETS = {  # Per-model overrides of CONTEXT_TOKEN_BUDGET
+    "gpt-4o": int(os.getenv("CONTEXT_TOKEN_BUDGET_GPT4O", 450)),
+    "gpt-3.5-turbo": int(os.getenv("CONTEXT_TOKEN_BUDGET_GPT35", 500))
+}
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"  # Answer greetings/meta questions without the LLM
+
 # === OpenAI Configuration ===
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 100))  # Shared HTTP pool across all LLM clients
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 20))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 120))  # Seconds an idle connection stays open
+LLM_PREWARM_CONNECTIONS = int(os.getenv("LLM_PREWARM_CONNECTIONS", 2))  # Connections opened at startup
+LLM_STREAM_USAGE = os.getenv("LLM_STREAM_USAGE", "true").lower() == "true"  # Ask the provider for token usage on streams
+
+# === Admission Control ===
+ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() == "true"
+MODEL_CONCURRENCY = {  # Concurrent /query requests per model per worker
+    "gpt-4o": int(os.getenv("MODEL_CONCURRENCY_GPT4O", 16)),
+    "gpt-4o-mini": int(os.getenv("MODEL_CONCURRENCY_GPT4O_MINI", 48)),
+    "gpt-3.5-turbo": int(os.getenv("MODEL_CONCURRENCY_GPT35", 48))
+}
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 64))  # Requests allowed to wait per model before shedding
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 2.0))  # Max seconds a request waits for a slot
+MODEL_COSTS = {  # Rate-limit tokens charged per request, relative to gpt-4o-mini
+    "gpt-4o": float(os.getenv("MODEL_COST_GPT4O", 10)),
+    "gpt-4o-mini": float(os.getenv("MODEL_COST_GPT4O_MINI", 1)),
+    "gpt-3.5-turbo": float(os.getenv("MODEL_COST_GPT35", 1))
+}
+CLIENT_RATE_LIMIT_BURST = float(os.getenv("CLIENT_RATE_LIMIT_BURST", 60))  # Token bucket capacity per client
+CLIENT_RATE_LIMIT_PER_SECOND = float(os.getenv("CLIENT_RATE_LIMIT_PER_SECOND", 1))  # Refill rate per client
+GLOBAL_RATE_LIMIT_BURST = float(os.getenv("GLOBAL_RATE_LIMIT_BURST", 2000))  # Token bucket capacity, all clients
+GLOBAL_RATE_LIMIT_PER_SECOND = float(os.getenv("GLOBAL_RATE_LIMIT_PER_SECOND", 50))  # Refill rate, all clients
+TRUSTED_PROXIES = [proxy.strip() for proxy in os.getenv("TRUSTED_PROXIES", "").split(",") if proxy.strip()]  # Peer IPs/CIDRs whose X-Forwarded-For is trusted
+
+# === Hedged Requests ===
+HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "true").lower() == "true"  # Race a backup call when the first token is late
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", 95))  # Observed TTFT percentile that triggers the backup
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", 20))  # TTFT samples needed before the threshold adapts
+HEDGE_INITIAL_DELAY = float(os.getenv("HEDGE_INITIAL_DELAY", 4.0))  # Threshold (s) until then
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", 0.5))  # Clamp of the adaptive threshold (s)
+HEDGE_MAX_DELAY = float(os.getenv("HEDGE_MAX_DELAY", 8.0))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", 200))  # Recent calls per model the threshold and budget look at
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", 0.1))  # Max share of recent calls hedged, so a slow provider is not doubly loaded
+HEDGE_FALLBACK_MODELS = {  # Backup model per primary (same model when unset)
+    "gpt-4o": os.getenv("HEDGE_FALLBACK_GPT4O", "gpt-4o-mini")
+}
+
+# === Batch Configuration ===
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 5000))  # Max queries accepted by /query/batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))  # Concurrent generations per model within a batch
+BATCH_RATE_LIMIT_BURST = float(os.getenv("BATCH_RATE_LIMIT_BURST", 500))  # Token bucket capacity per client for batch items
+BATCH_RATE_LIMIT_PER_SECOND = float(os.getenv("BATCH_RATE_LIMIT_PER_SECOND", 5))  # Refill rate per client for batch items
+BATCH_ADMISSION_TIMEOUT = float(os.getenv("BATCH_ADMISSION_TIMEOUT", 600))  # Max seconds a batch item waits for tokens and a model slot
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 256))  # Queries per batched embeddings request
+
+# === Streaming Configuration ===
+STREAM_COALESCE_MS = int(os.getenv("STREAM_COALESCE_MS", 30))  # Max time a delta waits before being flushed
+STREAM_COALESCE_BYTES = int(os.getenv("STREAM_COALESCE_BYTES", 64))  # Flush a delta frame once it reaches this size
+
+# === Debugging Configuration ===
+TRACE_REQUESTS_ENABLED = os.getenv("TRACE_REQUESTS_ENABLED", "true").lower() == "true"  # Honour X-Debug-Trace / "debug"
+TRACE_DEBUG_TOKEN = os.getenv("TRACE_DEBUG_TOKEN")  # X-Debug-Token value required to trace or profile (unset = nobody can)
+TRACE_PROFILE_DIR = os.getenv("TRACE_PROFILE_DIR")  # Where X-Debug-Profile writes pyinstrument reports (unset = off)
+TRACE_PROFILES_PER_MINUTE = int(os.getenv("TRACE_PROFILES_PER_MINUTE", 6))  # Max profile files written per worker per minute
+
+# === Startup Configuration ===
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"  # Warm clients/caches before reporting ready
+WARMUP_QUERY = os.getenv("WARMUP_QUERY", "What is the punishment for cheating under the Indian Penal Code?")
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", 30))  # Seconds before a warm-up stage is abandoned
+
+# === Health Monitoring ===
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", 15))  # Seconds between dependency checks
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", 5))  # Per-check timeout
 
 # === Server Configuration ===
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", 8000))
 WORKERS = int(os.getenv("WORKERS", 1))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"  # Identifies this worker process in shared Redis state
 
 # === Available Models ===
 AVAILABLE_MODELS = ["gpt-4o", "gpt-4o-mini", "gpt-3.5-turbo"]
\ No newline at end of file
@@ -8,6 +8,9 @@ from app.config import HOST, PORT, WORKERS, logger
 from app.routes import router
 from app.services.redis_service import redis_service
 from app.services.vector_service import vector_service
+from app.services.llm_service import llm_service
+from app.services.warmup import warmup
+from app.services.health import health_monitor
 
 # === Custom Lifespan Context Manager ===
 @asynccontextmanager
@@ -16,6 +19,8 @@ async def lifespan(app: FastAPI):
     try:
         # Initialize Redis
         await redis_service.init_redis()
+        redis_service.write_behind.start()
+        redis_service.metrics_publisher.start()
         logger.info("Redis connection established")
     except Exception as e:
         logger.error(f"Failed to connect to Redis: {str(e)}")
@@ -24,14 +29,27 @@ async def lifespan(app: FastAPI):
     try:
         # Initialize vector store
         vector_service.init_vector_store()
+        vector_service.init_citation_index()
         logger.info("Vector store initialized")
     except Exception as e:
         logger.error(f"Failed to initialize vector store: {str(e)}")
         raise  # This is critical, so we should fail startup
     
+    # Warm up (tokenizers, provider connections, one retrieval) in the background; /ready reports
+    # 503 until it finishes so traffic only arrives once the first request no longer pays for it
+    warmup.start()
+    # Dependency checks for /health and /status run here, never per probe
+    health_monitor.start()
+    
     yield
     
     # Shutdown: Clean up resources
+    await health_monitor.stop()
+    await warmup.stop()
+    vector_service.close()
+    await llm_service.close()
+    await redis_service.write_behind.drain()
+    await redis_service.metrics_publisher.stop()
     await redis_service.close()
 
 # === Initialize App ===
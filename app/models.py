@@ -11,19 +11,30 @@ class QueryRequest(BaseModel):
     query: str
     model_name: str = "gpt-4o-mini"  # Fastest model as default
     conversation_id: Optional[str] = None
-    strategy: str = "simple"  # Default to faster strategy
+    strategy: str = "simple"  # "simple", "fusion" or "hybrid" (lexical citation lookup, dense fallback)
     max_tokens: int = 1500  # Reduced default for speed
     temperature: float = 0.1  # Lower for faster processing
     stream: bool = True  # Enable streaming by default for faster perceived response
     include_history: bool = False  # Disabled by default for speed
+    stream_protocol: int = 1  # 1 = legacy chunk/full frames, 2 = coalesced delta frames
+    debug: bool = False  # Return a per-stage trace (also enabled by the X-Debug-Trace header)
+    profile: bool = False  # With debug, write a sampling profile to TRACE_PROFILE_DIR
+
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest]
+    max_concurrency: Optional[int] = Field(None, ge=1)  # Per-model limit, capped at BATCH_CONCURRENCY
 
 class ResponseMetadata(BaseModel):
     model: str
     strategy: str
     chunks_retrieved: int
-    tokens_used: int
+    tokens_used: int  # prompt_tokens + completion_tokens
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
     processing_time: float
     conversation_id: str
+    cached: bool = False
+    trace: Optional[Dict] = None  # Only for debug requests
 
 class QueryResponse(BaseModel):
     response: str
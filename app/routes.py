@@ -1,31 +1,58 @@
+import hmac
+import json
 import uuid
 import logging
-from datetime import datetime
+import ipaddress
 from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
-from fastapi.responses import JSONResponse, StreamingResponse
-from fastapi_limiter.depends import RateLimiter
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 
-from app.models import QueryRequest, HealthResponse
-from app.config import AVAILABLE_MODELS
+from app.models import QueryRequest, BatchQueryRequest, HealthResponse
+from app.config import AVAILABLE_MODELS, BATCH_MAX_ITEMS, TRUSTED_PROXIES, TRACE_DEBUG_TOKEN
+from app.utils.sse import SUPPORTED_PROTOCOLS, LEGACY_PROTOCOL
+from app.utils.metrics import metrics
 from app.services.llm_service import llm_service
 from app.services.redis_service import redis_service
+from app.services.semantic_cache import semantic_cache
+from app.services.token_usage import summarize_usage
+from app.services.warmup import warmup
+from app.services.health import health_monitor
+from app.services.admission import admission_controller, AdmissionRejected
+from app.services.hedging import hedger
+from app.services.coalescer import request_coalescer
 
 logger = logging.getLogger("NyayaGPT-API")
 
 router = APIRouter()
 
-# Rate limiter dependency with fallback
-async def rate_limit_dependency():
-    """Rate limiting dependency that works with or without Redis"""
-    if redis_service.client:
-        try:
-            # Use rate limiter only if Redis is available
-            limiter = RateLimiter(times=30, seconds=60)  # Increased limit
-            await limiter()
-        except Exception as e:
-            logger.warning(f"Rate limiting failed: {str(e)}")
-            # Continue without rate limiting
-            pass
+_trusted_proxies = [ipaddress.ip_network(proxy, strict=False) for proxy in TRUSTED_PROXIES]
+
+def _is_trusted_proxy(address):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _trusted_proxies)
+
+def get_client_id(request: Request) -> str:
+    """Identify the caller for per-client rate limits by peer address.
+    
+    Headers are client-controlled, so X-Forwarded-For is only followed through configured
+    TRUSTED_PROXIES: the nearest address not belonging to one of them is the client.
+    """
+    client_id = request.client.host if request.client else "unknown"
+    forwarded = request.headers.get("X-Forwarded-For")
+    if forwarded and _is_trusted_proxy(client_id):
+        for address in reversed([hop.strip() for hop in forwarded.split(",") if hop.strip()]):
+            client_id = address
+            if not _is_trusted_proxy(address):
+                break
+    return client_id
+
+def debug_authorized(request: Request) -> bool:
+    """Whether the caller presented the TRACE_DEBUG_TOKEN shared secret (tracing exposes internals
+    and profiling writes files, so neither is open to anonymous clients)"""
+    token = request.headers.get("X-Debug-Token")
+    return bool(TRACE_DEBUG_TOKEN and token and hmac.compare_digest(token, TRACE_DEBUG_TOKEN))
 
 async def get_or_create_conversation(request: Request) -> str:
     """Get existing conversation ID from cookie or create a new one"""
@@ -41,11 +68,16 @@ async def get_or_create_conversation(request: Request) -> str:
 async def health_check():
     """Check API health and available models"""
     return HealthResponse(
-        status="ok",
+        status=health_monitor.overall,
         version="1.0.0",
         available_models=AVAILABLE_MODELS
     )
 
+@router.get("/ready")
+async def readiness():
+    """Readiness probe: 503 until the startup warm-up has finished"""
+    return JSONResponse(warmup.status(), status_code=200 if warmup.ready else 503)
+
 @router.get("/")
 async def root():
     """Root endpoint for health checks"""
@@ -53,30 +85,13 @@ async def root():
 
 @router.get("/status")
 async def status():
-    """Detailed status endpoint for monitoring"""
-    status_info = {
-        "api": "running",
-        "redis": "disconnected",
-        "vector_store": "disconnected",
-        "timestamp": datetime.now().isoformat()
+    """Detailed status endpoint for monitoring (cached results of the background health checks)"""
+    return {
+        **health_monitor.status(),
+        "admission": admission_controller.status(),
+        "hedging": hedger.status(),
+        "coalescing": request_coalescer.stats()
     }
-    
-    # Check Redis connection
-    if redis_service.client:
-        try:
-            await redis_service.client.ping()
-            status_info["redis"] = "connected"
-        except Exception:
-            status_info["redis"] = "error"
-    
-    # Check vector store
-    try:
-        vector_store = llm_service.simple_strategy("test", llm_service.get_llm("gpt-4o-mini"))
-        status_info["vector_store"] = "connected"
-    except Exception:
-        status_info["vector_store"] = "error"
-    
-    return status_info
 
 @router.post("/query")
 async def query_endpoint(
@@ -88,10 +103,33 @@ async def query_endpoint(
     if not query_request.conversation_id:
         query_request.conversation_id = await get_or_create_conversation(request)
     
+    if debug_authorized(request):
+        if request.headers.get("X-Debug-Trace") == "1":
+            query_request.debug = True
+        if request.headers.get("X-Debug-Profile") == "1":
+            query_request.profile = True
+    else:
+        query_request.debug = query_request.profile = False
+    
+    # Shed excess load now with a fast 429/503, rather than letting it time out against the provider
+    try:
+        permit = await admission_controller.admit(get_client_id(request), query_request.model_name)
+    except AdmissionRejected as e:
+        logger.warning(f"Rejected query ({e.status_code}): {e.reason}")
+        raise HTTPException(status_code=e.status_code, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+    
     if query_request.stream:
+        # The X-Stream-Protocol header takes precedence over the request body field
+        protocol_header = request.headers.get("X-Stream-Protocol")
+        if protocol_header and protocol_header.isdigit():
+            query_request.stream_protocol = int(protocol_header)
+        if query_request.stream_protocol not in SUPPORTED_PROTOCOLS:
+            query_request.stream_protocol = LEGACY_PROTOCOL
+        
         response = StreamingResponse(
-            llm_service.generate_streaming_response(query_request),
-            media_type="text/event-stream"
+            admission_controller.hold(permit, llm_service.generate_streaming_response(query_request)),
+            media_type="text/event-stream",
+            headers={"X-Stream-Protocol": str(query_request.stream_protocol)}
         )
         
         response.set_cookie(
@@ -106,7 +144,9 @@ async def query_endpoint(
     try:
         response_data = await llm_service.process_query(query_request)
         
-        response = JSONResponse(content=response_data.dict())
+        response = JSONResponse(content=response_data.dict(exclude_none=True))
+        if response_data.metadata.trace:
+            response.headers["Server-Timing"] = response_data.metadata.trace["server_timing"]
         response.set_cookie(
             key="conversation_id",
             value=query_request.conversation_id,
@@ -123,6 +163,36 @@ async def query_endpoint(
             status_code=500,
             detail=f"An unexpected error occurred: {str(e)}"
         )
+    finally:
+        permit.release()
+
+@router.post("/query/batch")
+async def batch_query_endpoint(batch_request: BatchQueryRequest, request: Request):
+    """Process many queries, streaming one NDJSON result line per query as each finishes"""
+    if len(batch_request.queries) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(batch_request.queries)} queries (max {BATCH_MAX_ITEMS})"
+        )
+    
+    for query_request in batch_request.queries:
+        if query_request.model_name not in AVAILABLE_MODELS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Model {query_request.model_name} not available. Available models: {AVAILABLE_MODELS}"
+            )
+    
+    if not debug_authorized(request):
+        for query_request in batch_request.queries:
+            query_request.debug = query_request.profile = False
+    
+    async def ndjson_lines():
+        async for item in llm_service.process_batch(
+            batch_request.queries, batch_request.max_concurrency, client_id=get_client_id(request)
+        ):
+            yield json.dumps(item) + "\n"
+    
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
 
 @router.get("/conversation/{conversation_id}")
 async def get_conversation_history(conversation_id: str):
@@ -154,6 +224,32 @@ async def delete_conversation(conversation_id: str):
             detail=f"Error deleting conversation: {str(e)}"
         )
 
+@router.get("/cache/semantic/stats")
+async def semantic_cache_stats():
+    """Semantic cache hit rate and similarity distribution for threshold tuning"""
+    return semantic_cache.stats()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Stage latency histograms and pipeline counters, summed over all live workers (Prometheus text format)"""
+    snapshots = await redis_service.metrics_publisher.collect()
+    return PlainTextResponse(
+        metrics.render(metrics.merge(snapshots)),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+@router.get("/usage")
+async def token_usage():
+    """Prompt/completion token counters and generation throughput per model and worker"""
+    try:
+        return summarize_usage(await redis_service.get_usage())
+    except Exception as e:
+        logger.error(f"Error reading token usage: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error reading token usage: {str(e)}"
+        )
+
 @router.get("/clear-cache")
 async def clear_cache():
     """Clear the response cache"""
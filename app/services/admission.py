@@ -0,0 +1,162 @@
+import math
+import time
+import asyncio
+import logging
+from app.config import (
+    AVAILABLE_MODELS, ADMISSION_CONTROL_ENABLED, MODEL_CONCURRENCY, ADMISSION_QUEUE_SIZE,
+    ADMISSION_QUEUE_TIMEOUT, MODEL_COSTS, CLIENT_RATE_LIMIT_BURST, CLIENT_RATE_LIMIT_PER_SECOND,
+    GLOBAL_RATE_LIMIT_BURST, GLOBAL_RATE_LIMIT_PER_SECOND, BATCH_RATE_LIMIT_BURST, BATCH_RATE_LIMIT_PER_SECOND
+)
+from app.utils.metrics import ADMISSION_REJECTIONS, ADMISSION_WAIT_SECONDS
+from app.services.redis_service import redis_service
+
+logger = logging.getLogger("NyayaGPT-API")
+
+class AdmissionRejected(Exception):
+    """A query shed before doing any work; maps to a 429/503 with Retry-After"""
+
+    def __init__(self, status_code, reason, retry_after):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.wait = retry_after  # Exact seconds, for callers that wait instead of failing
+        self.retry_after = max(1, math.ceil(retry_after))
+
+class ModelGate:
+    """Concurrency limit for one model, with a bounded FIFO of waiters that give up at a deadline"""
+
+    def __init__(self, model_name, limit, max_waiting=ADMISSION_QUEUE_SIZE, timeout=ADMISSION_QUEUE_TIMEOUT):
+        self.model_name = model_name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.average_hold = 1.0  # EWMA of how long a request keeps its slot, for Retry-After
+        self._semaphore = asyncio.Semaphore(limit)
+
+    def retry_after(self):
+        """Rough time until the queue ahead of a new request has drained"""
+        return self.average_hold * (self.waiting + 1) / self.limit
+
+    async def acquire(self, timeout=None, shed=True):
+        """Wait for a slot; with shed=False a full queue is waited on rather than rejected"""
+        if shed and self._semaphore.locked() and self.waiting >= self.max_waiting:
+            raise AdmissionRejected(503, f"{self.model_name} is at capacity", self.retry_after())
+
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            raise AdmissionRejected(503, f"Timed out waiting for {self.model_name} capacity", self.retry_after())
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start, model=self.model_name)
+        return time.perf_counter()
+
+    def release(self, acquired_at):
+        self.active -= 1
+        self.average_hold = 0.9 * self.average_hold + 0.1 * (time.perf_counter() - acquired_at)
+        self._semaphore.release()
+
+class Permit:
+    """A held model slot; release is idempotent"""
+
+    def __init__(self, gate=None, acquired_at=None):
+        self.gate = gate
+        self.acquired_at = acquired_at
+
+    def release(self):
+        if self.gate is not None:
+            self.gate.release(self.acquired_at)
+            self.gate = None
+
+    def __del__(self):
+        # A streaming response whose client disconnected before the body started never runs
+        # hold()'s finally block; dropping the generator (and this permit) must still free the slot
+        self.release()
+
+class AdmissionController:
+    """Sheds excess /query and /query/batch load up front: a distributed token bucket per client and
+    for the whole deployment (charged by model cost), then a per-model concurrency gate on this worker"""
+
+    def __init__(self, enabled=ADMISSION_CONTROL_ENABLED):
+        self.enabled = enabled
+        self.gates = {
+            model_name: ModelGate(model_name, MODEL_CONCURRENCY.get(model_name, 32))
+            for model_name in AVAILABLE_MODELS
+        }
+
+    async def _check_rate(self, client_id, model_name, batch=False):
+        if not redis_service.client:
+            return
+        if batch:
+            client_bucket = (f"ratelimit:batch:{client_id}", BATCH_RATE_LIMIT_BURST, BATCH_RATE_LIMIT_PER_SECOND)
+        else:
+            client_bucket = (f"ratelimit:client:{client_id}", CLIENT_RATE_LIMIT_BURST, CLIENT_RATE_LIMIT_PER_SECOND)
+        buckets = [client_bucket, ("ratelimit:global", GLOBAL_RATE_LIMIT_BURST, GLOBAL_RATE_LIMIT_PER_SECOND)]
+        # A cost above a bucket's capacity could never be admitted, however long the caller waited
+        cost = min(MODEL_COSTS.get(model_name, 1.0), *(capacity for _, capacity, _ in buckets))
+        try:
+            wait_ms = await redis_service.take_tokens(buckets, cost)
+        except Exception as e:
+            logger.warning(f"Rate limiting failed: {str(e)}")
+            return  # Fail open: Redis trouble must not take the API down with it
+        if wait_ms:
+            raise AdmissionRejected(429, "Rate limit exceeded", wait_ms / 1000)
+
+    async def admit(self, client_id, model_name):
+        """Admit a query or raise AdmissionRejected; the returned permit must be released"""
+        if not self.enabled:
+            return Permit()
+        gate = self.gates.get(model_name)
+        try:
+            await self._check_rate(client_id, model_name)
+            if gate is None:
+                return Permit()  # Unknown model: rejected by the LLM service itself
+            return Permit(gate, await gate.acquire())
+        except AdmissionRejected as e:
+            ADMISSION_REJECTIONS.inc(model=model_name, reason="rate_limit" if e.status_code == 429 else "overload")
+            raise
+
+    async def admit_batch_item(self, client_id, model_name, deadline):
+        """Admit one batch generation, waiting (until the monotonic `deadline`) for rate-limit
+        tokens and a model slot instead of failing; batch items use their own per-client bucket"""
+        if not self.enabled:
+            return Permit()
+        gate = self.gates.get(model_name)
+        try:
+            while True:
+                try:
+                    await self._check_rate(client_id, model_name, batch=True)
+                    break
+                except AdmissionRejected as e:
+                    if time.monotonic() + e.wait > deadline:
+                        raise
+                    await asyncio.sleep(e.wait)
+            if gate is None:
+                return Permit()
+            remaining = max(0.0, deadline - time.monotonic())
+            return Permit(gate, await gate.acquire(timeout=remaining, shed=False))
+        except AdmissionRejected as e:
+            ADMISSION_REJECTIONS.inc(model=model_name, reason="rate_limit" if e.status_code == 429 else "overload")
+            raise
+
+    async def hold(self, permit, stream):
+        """Keep the permit for as long as a streaming response is being produced"""
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            permit.release()
+
+    def status(self):
+        return {
+            model_name: {"active": gate.active, "waiting": gate.waiting, "limit": gate.limit}
+            for model_name, gate in self.gates.items()
+        }
+
+# Global admission controller instance
+admission_controller = AdmissionController()
@@ -0,0 +1,144 @@
+import re
+import math
+import time
+import logging
+from collections import defaultdict
+from urllib.parse import urlparse
+from app.config import CITATION_MIN_COVERAGE
+
+logger = logging.getLogger("NyayaGPT-API")
+
+# === Citation Tokenization ===
+_ACT_ALIASES = [
+    (re.compile(r"\bindian penal code\b"), " ipc "),
+    (re.compile(r"\b(?:code of criminal procedure|criminal procedure code|cr\.?\s?p\.?\s?c\.?)"), " crpc "),
+    (re.compile(r"\b(?:code of civil procedure|civil procedure code|c\.p\.c\.?)"), " cpc "),
+    (re.compile(r"\bi\.p\.c\.?"), " ipc "),
+    (re.compile(r"\bconstitution of india\b"), " constitution "),
+    (re.compile(r"\bbharatiya nyaya sanhita\b"), " bns "),
+    (re.compile(r"\bbharatiya nagarik suraksha sanhita\b"), " bnss "),
+    (re.compile(r"\b(?:indian )?evidence act\b"), " evidence "),
+]
+# An "s" after an apostrophe is a contraction ("it's 5 years"), not a section prefix
+_PROVISION_RE = re.compile(r"(?<!['\u2019])\b(section|sec|ss|s|u/s|article|art|rule|order)\.?\s*(\d+[a-z]?)\b")
+_PROVISION_PREFIX = {
+    "section": "sec", "sec": "sec", "ss": "sec", "s": "sec", "u/s": "sec",
+    "article": "art", "art": "art", "rule": "rule", "order": "order"
+}
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and any are as at be by can does for from how i in into is it its me of on or "
+    "please tell than that the this to under was what when which who why with explain "
+    "about case judgment judgement law v vs versus".split()
+)
+
+# Citation-shaped queries: a statute provision, or a "Party v. Party" case name. Both sides of a
+# case name must look like parties - capitalised names, or the State/Union on either side - so
+# comparisons such as "murder vs culpable homicide" stay with dense retrieval.
+_PARTY = r"[A-Z][\w.&'-]*"
+_GOVERNMENT = r"(?i:state|union)\b"
+_VERSUS = r"\s+(?i:v\.?|vs\.?|versus)\s+"
+_CITATION_QUERY_RE = re.compile(
+    r"(?<!['\u2019])\b(?i:section|sec|s|u/s|article|art|rule|order)\.?\s*\d+[a-zA-Z]?\b"
+    rf"|\b{_PARTY}{_VERSUS}(?:{_PARTY}|{_GOVERNMENT})"
+    rf"|\b\w[\w.&]*{_VERSUS}{_GOVERNMENT}"
+    rf"|\b{_GOVERNMENT}(?:\s+[\w.&]+){{0,6}}?{_VERSUS}\w"
+)
+
+def is_citation_query(text):
+    """Detect statute/section/case-name lookups that lexical search answers better than dense search"""
+    return bool(_CITATION_QUERY_RE.search(text))
+
+def tokenize(text):
+    """Split text into word tokens plus normalized provision tokens such as `sec:498a` or `art:21`"""
+    text = text.lower()
+    for pattern, alias in _ACT_ALIASES:
+        text = pattern.sub(alias, text)
+
+    tokens = [f"{_PROVISION_PREFIX[kind]}:{number}" for kind, number in _PROVISION_RE.findall(text)]
+    text = _PROVISION_RE.sub(" ", text)
+    tokens.extend(word for word in _WORD_RE.findall(text) if word not in _STOPWORDS)
+    return tokens
+
+def provision_signature(text):
+    """Sorted provision and number tokens of a query (`sec:420`, `2019`); two queries must have the
+    same signature for one to be answered with the other's response"""
+    return sorted({token for token in tokenize(text) if ":" in token or token.isdigit()})
+
+def _url_words(url):
+    path = urlparse(url or "").path
+    return " ".join(part for part in re.split(r"[/\-_]+", path) if part and not part.isdigit())
+
+class CitationIndex:
+    """BM25 inverted index over judgment titles, case names, provisions and URL slugs"""
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.source = None
+        self._postings = {}
+        self._lengths = []
+        self._avg_length = 0.0
+
+    @property
+    def ready(self):
+        return self.source is not None and bool(self._lengths)
+
+    def build(self, source):
+        """Index every row of a local snapshot (see vector_backends.LocalBackend)"""
+        start = time.perf_counter()
+        postings = defaultdict(list)
+        lengths = []
+        for row in range(source.vectors.shape[0]):
+            metadata = source.record(row).get("metadata", {})
+            tokens = tokenize(f"{metadata.get('title', '')} {_url_words(metadata.get('url', ''))}")
+            counts = defaultdict(int)
+            for token in tokens:
+                counts[token] += 1
+            for token, tf in counts.items():
+                postings[token].append((row, tf))
+            lengths.append(len(tokens))
+
+        self._postings = dict(postings)
+        self._lengths = lengths
+        self._avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+        self.source = source
+        logger.info(
+            f"Citation index built: {len(lengths)} documents, {len(self._postings)} terms "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+    def search(self, query, k=3):
+        """BM25 top-k restricted to documents that match the query's provisions and most of its terms"""
+        if not self.ready:
+            return []
+
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        provisions = {term for term in terms if ":" in term}
+
+        n = len(self._lengths)
+        scores = defaultdict(float)
+        matched = defaultdict(int)
+        provision_hits = defaultdict(int)
+        for term in terms:
+            postings = self._postings.get(term, [])
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for row, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[row] / self._avg_length)
+                scores[row] += idf * tf * (self.k1 + 1) / (tf + norm)
+                matched[row] += 1
+                if term in provisions:
+                    provision_hits[row] += 1
+
+        candidates = [
+            row for row in scores
+            if matched[row] / len(terms) >= CITATION_MIN_COVERAGE
+            and (not provisions or provision_hits[row])
+        ]
+        top = sorted(candidates, key=scores.get, reverse=True)[:k]
+        return [(self.source.document(row), scores[row]) for row in top]
+
+# Global citation index instance
+citation_index = CitationIndex()
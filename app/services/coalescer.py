@@ -0,0 +1,266 @@
+import json
+import time
+import asyncio
+import logging
+from app.config import SINGLE_FLIGHT_ENABLED, SINGLE_FLIGHT_TIMEOUT, SINGLE_FLIGHT_RELAY_INTERVAL, WORKER_ID
+from app.services.redis_service import redis_service
+
+logger = logging.getLogger("NyayaGPT-API")
+
+class FlightAbandoned(Exception):
+    """The leader of a coalesced request failed or went away before finishing"""
+
+class Flight:
+    """A generation in progress that identical requests subscribe to instead of repeating it"""
+
+    def __init__(self, key):
+        self.key = key
+        self.chunks = []
+        self.result = None
+        self.error = None
+        self.finished = False
+        self._signal = asyncio.Event()
+        self._finished = asyncio.Event()  # Wakes the cross-worker relay as soon as the leader is done
+        self._relay_task = None
+
+    def _notify(self):
+        self._signal.set()
+        self._signal = asyncio.Event()
+
+    def publish(self, chunk):
+        """Fan out a streamed chunk to local and remote followers"""
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, result):
+        """Hand the final response (QueryResponse-shaped dict) to every follower"""
+        if self.finished:
+            return
+        self.result = result
+        self.finished = True
+        self._notify()
+        self._finished.set()
+
+    def fail(self, error):
+        if self.finished:
+            return
+        self.error = str(error)
+        self.finished = True
+        self._notify()
+        self._finished.set()
+
+class LocalFollower:
+    """Follows a leader running in this worker"""
+
+    def __init__(self, flight):
+        self.flight = flight
+
+    @property
+    def final(self):
+        return self.flight.result
+
+    async def chunks(self):
+        """Yield the leader's chunks from the start, then live until it finishes"""
+        i = 0
+        deadline = time.monotonic() + SINGLE_FLIGHT_TIMEOUT
+        while True:
+            signal = self.flight._signal
+            while i < len(self.flight.chunks):
+                yield self.flight.chunks[i]
+                i += 1
+            if self.flight.finished:
+                if self.flight.error is not None:
+                    raise FlightAbandoned(self.flight.error)
+                return
+            try:
+                await asyncio.wait_for(signal.wait(), timeout=max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                raise FlightAbandoned("Timed out waiting for the coalesced request")
+
+    async def result(self):
+        """Wait for the leader's final response; None means run the request independently"""
+        try:
+            async for _ in self.chunks():
+                pass
+        except FlightAbandoned:
+            return None
+        return self.final
+
+class RemoteFollower:
+    """Follows a leader running in another worker through Redis pub/sub"""
+
+    def __init__(self, key):
+        self.key = key
+        self.final = None
+
+    async def chunks(self):
+        client = redis_service.client
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(_channel(self.key))
+            # Subscribed first, so everything published after this read is delivered on the channel.
+            # The leader only starts relaying chunks once it sees a registered follower.
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.incr(_subs_key(self.key))
+                pipe.pexpire(_subs_key(self.key), int(SINGLE_FLIGHT_TIMEOUT * 1000))
+                pipe.get(_buffer_key(self.key))
+                pipe.exists(_lock_key(self.key))
+                _, _, prefix, leader_alive = await pipe.execute()
+            if not leader_alive:
+                raise FlightAbandoned("Leader already finished or gone")
+
+            received = 0
+            if prefix:
+                received = len(prefix)
+                yield prefix
+
+            deadline = time.monotonic() + SINGLE_FLIGHT_TIMEOUT
+            while time.monotonic() < deadline:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if not message:
+                    continue
+                event = json.loads(message["data"])
+                if "chunk" in event:
+                    offset, chunk = event["offset"], event["chunk"]
+                    if offset + len(chunk) <= received:
+                        continue  # Already covered by the buffered prefix
+                    yield chunk[received - offset:]
+                    received = offset + len(chunk)
+                elif "done" in event:
+                    self.final = event["done"]
+                    return
+                else:
+                    raise FlightAbandoned(event.get("error", "Leader failed"))
+            raise FlightAbandoned("Timed out waiting for the coalesced request")
+        finally:
+            await pubsub.aclose()
+
+    async def result(self):
+        try:
+            async for _ in self.chunks():
+                pass
+        except FlightAbandoned:
+            return None
+        except Exception as e:
+            logger.warning(f"Remote coalescing failed: {str(e)}")
+            return None
+        return self.final
+
+def _lock_key(key):
+    return f"inflight:{key}"
+
+def _buffer_key(key):
+    return f"inflight:{key}:buf"
+
+def _subs_key(key):
+    return f"inflight:{key}:subs"
+
+def _channel(key):
+    return f"inflight:{key}:events"
+
+class RequestCoalescer:
+    """Single-flight coalescing of identical queries, keyed on the response cache key"""
+
+    def __init__(self):
+        self._flights = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def join(self, key):
+        """Return (flight, None) when the caller leads the request, else (None, follower)"""
+        if not SINGLE_FLIGHT_ENABLED:
+            return Flight(key), None
+
+        flight = self._flights.get(key)
+        if flight and not flight.finished:
+            self.followers += 1
+            return None, LocalFollower(flight)
+
+        relay = False
+        if redis_service.client:
+            try:
+                acquired = await redis_service.client.set(
+                    _lock_key(key), WORKER_ID, nx=True, px=int(SINGLE_FLIGHT_TIMEOUT * 1000)
+                )
+                relay = True
+            except Exception as e:
+                logger.warning(f"Cross-worker coalescing unavailable: {str(e)}")
+                acquired = True
+            if not acquired:
+                self.followers += 1
+                return None, RemoteFollower(key)
+
+        # Another local request may have become leader while the lock call was in flight
+        flight = self._flights.get(key)
+        if flight and not flight.finished:
+            self.followers += 1
+            return None, LocalFollower(flight)
+
+        flight = Flight(key)
+        self._flights[key] = flight
+        if relay:
+            flight._relay_task = asyncio.create_task(self._relay_to_redis(flight))
+
+        self.leaders += 1
+        return flight, None
+
+    def release(self, flight):
+        """Drop a finished flight; failing it first if the leader never finished"""
+        if not flight.finished:
+            flight.fail("Leader request ended without a result")
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    async def _relay_to_redis(self, flight):
+        """Publish the leader's chunks and final result to followers in other workers.
+
+        Chunks are only relayed once a remote follower has registered on the subs counter, and
+        then in one pipeline per SINGLE_FLIGHT_RELAY_INTERVAL; a leader nobody follows sends just
+        the final event and the cleanup.
+        """
+        client = redis_service.client
+        relayed = 0  # Chunks already in the Redis buffer
+        offset = 0
+        followed = False
+        try:
+            while not flight.finished:
+                try:
+                    await asyncio.wait_for(flight._finished.wait(), timeout=SINGLE_FLIGHT_RELAY_INTERVAL)
+                    break  # The done event carries the full response
+                except asyncio.TimeoutError:
+                    pass
+                if relayed == len(flight.chunks):
+                    continue
+                if not followed:
+                    followed = int(await client.get(_subs_key(flight.key)) or 0) > 0
+                    if not followed:
+                        continue
+
+                text = "".join(flight.chunks[relayed:])
+                relayed = len(flight.chunks)
+                async with client.pipeline(transaction=False) as pipe:
+                    pipe.append(_buffer_key(flight.key), text)
+                    pipe.publish(_channel(flight.key), json.dumps({"offset": offset, "chunk": text}))
+                    pipe.pexpire(_buffer_key(flight.key), int(SINGLE_FLIGHT_TIMEOUT * 1000))
+                    await pipe.execute()
+                offset += len(text)
+
+            # One MULTI, lock deleted first: a follower either sees the lock (and, being subscribed
+            # already, gets this event) or sees it gone and runs the query itself
+            event = {"error": flight.error} if flight.error is not None else {"done": flight.result}
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.delete(_lock_key(flight.key), _buffer_key(flight.key), _subs_key(flight.key))
+                pipe.publish(_channel(flight.key), json.dumps(event))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Coalescing relay failed for {flight.key}: {str(e)}")
+
+    def stats(self):
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "followers": self.followers
+        }
+
+# Global request coalescer instance
+request_coalescer = RequestCoalescer()
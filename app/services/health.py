@@ -0,0 +1,93 @@
+import time
+import asyncio
+import logging
+from datetime import datetime
+from app.config import HEALTH_CHECK_INTERVAL, HEALTH_CHECK_TIMEOUT
+from app.services.redis_service import redis_service
+from app.services.vector_service import vector_service
+from app.services.llm_service import llm_service
+
+logger = logging.getLogger("NyayaGPT-API")
+
+class HealthMonitor:
+    """Checks Redis, the vector index and the LLM provider in the background, so /health and
+    /status answer from cached results instead of calling the dependencies per probe"""
+
+    def __init__(self, interval=HEALTH_CHECK_INTERVAL, timeout=HEALTH_CHECK_TIMEOUT):
+        self.interval = interval
+        self.timeout = timeout
+        self.checks = {}
+        self._task = None
+
+    def start(self):
+        if self._task:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self.check_all()
+            await asyncio.sleep(self.interval)
+
+    async def check_all(self):
+        results = await asyncio.gather(
+            self._check("redis", self._check_redis),
+            self._check("vector_store", vector_service.describe),
+            self._check("openai", lambda: llm_service.ping(timeout=self.timeout))
+        )
+        for name, result in results:
+            previous = self.checks.get(name, {}).get("status")
+            if previous and previous != result["status"]:
+                logger.warning(f"Health of {name} changed: {previous} -> {result['status']}")
+            self.checks[name] = result
+
+    async def _check(self, name, fn):
+        start = time.perf_counter()
+        result = {"status": "connected"}
+        try:
+            details = await asyncio.wait_for(fn(), timeout=self.timeout)
+            if isinstance(details, dict):
+                result["details"] = details
+        except ValueError as e:  # Dependency was never initialized
+            result = {"status": "disconnected", "error": str(e)}
+        except asyncio.TimeoutError:
+            result = {"status": "error", "error": f"timed out after {self.timeout}s"}
+        except Exception as e:
+            result = {"status": "error", "error": str(e)}
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        result["checked_at"] = datetime.now().isoformat()
+        return name, result
+
+    async def _check_redis(self):
+        if not redis_service.client:
+            raise ValueError("Redis not connected")
+        await redis_service.client.ping()
+
+    @property
+    def overall(self):
+        if not self.checks:
+            return "starting"
+        return "ok" if all(check["status"] == "connected" for check in self.checks.values()) else "degraded"
+
+    def status(self):
+        """Cached state of every dependency, with the time each was last checked"""
+        return {
+            "api": "running",
+            "status": self.overall,
+            **{name: check["status"] for name, check in self.checks.items()},
+            "checks": self.checks,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+# Global health monitor instance
+health_monitor = HealthMonitor()
@@ -0,0 +1,162 @@
+import time
+import asyncio
+import logging
+from collections import deque
+import numpy as np
+from app.config import (
+    HEDGING_ENABLED, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES, HEDGE_INITIAL_DELAY, HEDGE_MIN_DELAY,
+    HEDGE_MAX_DELAY, HEDGE_WINDOW, HEDGE_MAX_RATIO, HEDGE_FALLBACK_MODELS
+)
+from app.utils.metrics import LLM_HEDGES, LLM_HEDGE_CANCELS
+from app.services.token_usage import TokenUsage
+
+logger = logging.getLogger("NyayaGPT-API")
+
+class TTFTWindow:
+    """Recent time-to-first-token samples of one model, and which of its recent calls were hedged"""
+
+    def __init__(self, size=HEDGE_WINDOW):
+        self.samples = deque(maxlen=size)
+        self.hedged = deque(maxlen=size)
+
+class Attempt:
+    """One streaming LLM call racing for its first token"""
+
+    def __init__(self, model_name, messages):
+        self.model_name = model_name
+        self.messages = messages.__aiter__()
+        self.started = time.perf_counter()
+        self.head = []  # Chunks read while waiting for content (usually just the first token)
+        self.task = asyncio.create_task(self._first_token())
+
+    async def _first_token(self):
+        async for message in self.messages:
+            self.head.append(message)
+            if message.content:
+                return time.perf_counter() - self.started
+        return None  # Finished without any content
+
+    async def cancel(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except BaseException:
+            pass
+        try:
+            await self.messages.aclose()  # Closes the provider's HTTP stream
+        except Exception:
+            pass
+
+class Hedger:
+    """Hedged LLM calls: when a call's first token is later than that model's recent TTFT
+    percentile, a backup call (the same or a faster fallback model) is started, whichever starts
+    streaming first is used and the other is cancelled.
+
+    Hedges are capped at HEDGE_MAX_RATIO of recent calls per model, so a provider that is slow for
+    everyone is not sent twice the traffic.
+    """
+
+    def __init__(self, enabled=HEDGING_ENABLED):
+        self.enabled = enabled
+        self._windows = {}
+
+    def _window(self, model_name):
+        return self._windows.setdefault(model_name, TTFTWindow())
+
+    def threshold(self, model_name):
+        """Seconds to wait for the first token before hedging"""
+        samples = self._window(model_name).samples
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_INITIAL_DELAY
+        return min(max(float(np.percentile(samples, HEDGE_PERCENTILE)), HEDGE_MIN_DELAY), HEDGE_MAX_DELAY)
+
+    def _may_hedge(self, model_name):
+        hedged = self._window(model_name).hedged
+        return sum(hedged) <= HEDGE_MAX_RATIO * len(hedged)
+
+    async def stream(self, start, prompt, usage: TokenUsage):
+        """Yield the message chunks of `start(model_name)`, hedged when its first token is late.
+
+        `usage` is switched to the winning model before the first chunk is yielded.
+        """
+        model_name = usage.model_name
+        if not self.enabled:
+            async for message in start(model_name):
+                yield message
+            return
+
+        window = self._window(model_name)
+        threshold = self.threshold(model_name)
+        attempts = [Attempt(model_name, start(model_name))]
+        winner = None
+        try:
+            done, _ = await asyncio.wait({attempts[0].task}, timeout=threshold)
+            hedged = not done and self._may_hedge(model_name)
+            window.hedged.append(hedged)
+            if hedged:
+                backup_model = HEDGE_FALLBACK_MODELS.get(model_name) or model_name
+                logger.info(
+                    f"No first token from {model_name} after {threshold:.2f}s - hedging with {backup_model}"
+                )
+                attempts.append(Attempt(backup_model, start(backup_model)))
+
+            winner = await self._first_to_start(attempts)
+            ttft = winner.task.result()
+            if ttft is not None:
+                self._window(winner.model_name).samples.append(ttft)
+            for attempt in attempts:
+                if attempt is winner:
+                    continue
+                failed = attempt.task.done() and attempt.task.exception() is not None
+                await attempt.cancel()
+                if failed:
+                    continue
+                # A losing primary's real TTFT is unknown but at least this long; keeping it as a
+                # sample stops the threshold from drifting down while the provider is slow
+                if attempt is attempts[0]:
+                    window.samples.append(time.perf_counter() - attempt.started)
+                LLM_HEDGE_CANCELS.inc(model=attempt.model_name)
+                # The cancelled call was still billed for its prompt
+                await TokenUsage(attempt.model_name).finish(prompt, "")
+            if hedged:
+                LLM_HEDGES.inc(model=model_name, winner="primary" if winner is attempts[0] else "backup")
+
+            usage.model_name = winner.model_name
+            for message in winner.head:
+                yield message
+            async for message in winner.messages:
+                yield message
+        finally:
+            for attempt in attempts:
+                if attempt is not winner and not attempt.task.done():
+                    await attempt.cancel()
+            if winner is not None:
+                await winner.messages.aclose()
+
+    async def _first_to_start(self, attempts):
+        """The attempt that produced a first token (or finished cleanly) first; raises only if all fail"""
+        pending = {attempt.task: attempt for attempt in attempts}
+        error = None
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                attempt = pending.pop(task)
+                if task.exception() is None:
+                    return attempt
+                error = task.exception()
+                logger.warning(f"LLM call to {attempt.model_name} failed before its first token: {str(error)}")
+        raise error
+
+    def status(self):
+        """Current threshold and hedge rate per model"""
+        return {
+            model_name: {
+                "threshold_seconds": round(self.threshold(model_name), 3),
+                "samples": len(window.samples),
+                "hedge_rate": round(sum(window.hedged) / len(window.hedged), 3) if window.hedged else 0.0
+            }
+            for model_name, window in self._windows.items()
+        }
+
+# Global hedger instance
+hedger = Hedger()
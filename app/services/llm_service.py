@@ -1,172 +1,393 @@
+import re
 import time
+import asyncio
 import uuid
-import json
 import logging
-from typing import AsyncGenerator
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import StrOutputParser
-from app.config import AVAILABLE_MODELS
+from typing import AsyncGenerator, List, Optional
+import httpx
+import numpy as np
+from app.config import (
+    AVAILABLE_MODELS, FUSION_VARIANTS, RRF_K, SEMANTIC_CACHE_ENABLED, STREAM_REPLAY_CHUNK_SIZE,
+    CONVERSATION_HISTORY_MESSAGES, OPENAI_API_KEY, OPENAI_BASE_URL, LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS, LLM_KEEPALIVE_EXPIRY, LLM_PREWARM_CONNECTIONS, LLM_STREAM_USAGE,
+    BATCH_CONCURRENCY, BATCH_ADMISSION_TIMEOUT, EMBEDDING_BATCH_SIZE, FAST_PATH_ENABLED, CONTEXT_TOKEN_BUDGET, CONTEXT_TOKEN_BUDGETS,
+    TRACE_REQUESTS_ENABLED, RETRIEVAL_K, RETRIEVAL_FETCH_K
+)
 from app.models import QueryRequest, QueryResponse, ResponseMetadata
 from app.utils.prompts import final_prompt, fusion_prompt
+from app.utils.sse import SSEStream
+from app.utils.router import route_query
+from app.utils.tracing import request_trace, current_trace, annotate
+from app.utils.metrics import (
+    stage_timer, REQUEST_SECONDS, TTFT_SECONDS, GENERATION_SECONDS, CACHE_LOOKUPS,
+    FAST_PATH_ANSWERS, RETRIEVAL_FALLBACKS, STAGE_ERRORS
+)
 from app.utils.helpers import (
-    is_simple_greeting, get_greeting_response, format_docs, 
-    count_tokens, format_conversation_history
+    pack_context, format_conversation_history, reciprocal_rank_fusion, doc_key
 )
 from app.services.redis_service import redis_service
 from app.services.vector_service import vector_service
+from app.services.semantic_cache import semantic_cache
+from app.services.coalescer import request_coalescer, FlightAbandoned
+from app.services.citation_index import citation_index, is_citation_query
+from app.services.token_usage import TokenUsage
+from app.services.hedging import hedger
+from app.services.admission import admission_controller, AdmissionRejected
 
 logger = logging.getLogger("NyayaGPT-API")
 
 class LLMService:
     def __init__(self):
         self.models = self._init_models()
+        # One long-lived client per (model, streaming), all sharing a keep-alive connection pool
+        self._clients = {}
+        limits = httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+        )
+        self._http_client = httpx.Client(limits=limits)
+        self._http_async_client = httpx.AsyncClient(limits=limits)
     
     def _init_models(self):
         """Initialize LLM models configuration"""
         return {
-            "gpt-4o": lambda streaming=False: ChatOpenAI(
-                model="gpt-4o", 
-                temperature=0.1, 
-                max_tokens=1500,
-                streaming=streaming,
-                request_timeout=20
-            ),
-            "gpt-4o-mini": lambda streaming=False: ChatOpenAI(
-                model="gpt-4o-mini", 
-                temperature=0.1, 
-                max_tokens=1500,
-                streaming=streaming,
-                request_timeout=15
-            ),
-            "gpt-3.5-turbo": lambda streaming=False: ChatOpenAI(
-                model="gpt-3.5-turbo", 
-                temperature=0.1, 
-                max_tokens=1200,
+            "gpt-4o": {"max_tokens": 1500, "request_timeout": 20},
+            "gpt-4o-mini": {"max_tokens": 1500, "request_timeout": 15},
+            "gpt-3.5-turbo": {"max_tokens": 1200, "request_timeout": 10}
+        }
+    
+    def _get_client(self, model_name: str, streaming: bool):
+        key = (model_name, streaming)
+        if key not in self._clients:
+            from langchain_openai import ChatOpenAI  # Heavy import, deferred to the startup warm-up
+            self._clients[key] = ChatOpenAI(
+                model=model_name,
+                temperature=0.1,
                 streaming=streaming,
-                request_timeout=10
+                stream_usage=LLM_STREAM_USAGE,
+                http_client=self._http_client,
+                http_async_client=self._http_async_client,
+                **self.models[model_name]
             )
-        }
+        return self._clients[key]
     
-    def get_llm(self, model_name: str, streaming: bool = False):
-        """Get LLM instance"""
+    def get_llm(self, model_name: str, streaming: bool = False, temperature=None, max_tokens=None):
+        """Get the pooled LLM client, with per-request parameters bound at call time"""
         if model_name not in self.models:
             raise ValueError(f"Model {model_name} not available. Available models: {list(self.models.keys())}")
-        return self.models[model_name](streaming=streaming)
+        llm = self._get_client(model_name, streaming)
+        params = {}
+        if temperature is not None:
+            params["temperature"] = temperature
+        if max_tokens is not None:
+            params["max_tokens"] = max_tokens
+        return llm.bind(**params) if params else llm
+    
+    async def warm_up(self):
+        """Build every client and open keep-alive connections to the provider ahead of traffic"""
+        def build_clients():
+            for model_name in self.models:
+                for streaming in (False, True):
+                    self._get_client(model_name, streaming)
+        
+        # Off the loop: the first client pulls in langchain_openai, which is slow to import
+        await asyncio.to_thread(build_clients)
+        
+        async def open_connection():
+            try:
+                await self.ping()
+            except Exception as e:
+                logger.warning(f"LLM connection pre-warm failed: {str(e)}")
+        
+        await asyncio.gather(*(open_connection() for _ in range(LLM_PREWARM_CONNECTIONS)))
+        logger.info(f"LLM clients ready ({len(self._clients)} clients, {LLM_PREWARM_CONNECTIONS} warm connections)")
+    
+    async def ping(self, timeout=5):
+        """Cheap provider reachability check over the shared pool (lists models, spends no tokens)"""
+        response = await self._http_async_client.get(
+            f"{OPENAI_BASE_URL}/models",
+            headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
+            timeout=timeout
+        )
+        response.raise_for_status()
+        return response.status_code
     
-    def fusion_strategy(self, query, llm):
-        """Optimized fusion strategy for faster retrieval"""
+    async def close(self):
+        """Close the shared LLM connection pools"""
+        await self._http_async_client.aclose()
+        self._http_client.close()
+    
+    async def fusion_strategy(self, query, llm):
+        """Fusion retrieval: batch-embed rephrasings, search concurrently and merge with RRF"""
         try:
-            vector_store = vector_service.get_vector_store()
-            
             # Skip fusion for very short queries
             if len(query.split()) <= 3:
-                return self.simple_strategy(query, llm)
+                return await self.simple_strategy(query, llm)
                 
-            fusion_chain = fusion_prompt | llm
-            response = fusion_chain.invoke({"question": query})
-            variants = [line.strip("- ") for line in response.content.strip().split("\n") if line.strip()][:2]
+            usage = TokenUsage(self._model_name(llm))
+            prompt = fusion_prompt.format_prompt(question=query)
+            with stage_timer("fusion_rephrase"):
+                response = await llm.ainvoke(prompt)
+            usage.observe(response)
+            await usage.finish(prompt.to_string(), response.content)
+            variants = [
+                re.sub(r"^\s*(?:[-*]|\d+[.)])\s*", "", line).strip()
+                for line in response.content.strip().split("\n") if line.strip()
+            ][:FUSION_VARIANTS]
             variants.insert(0, query)
             
-            seen = set()
-            all_docs = []
-            
-            # Retrieve fewer documents per variant for speed
-            for variant in variants[:2]:  # Only use first 2 variants
-                for doc in vector_store.similarity_search(variant, k=3):  # Reduced from 5 to 3
-                    hash_ = doc.page_content[:50]  # Shorter hash for speed
-                    if hash_ not in seen:
-                        seen.add(hash_)
-                        all_docs.append(doc)
-            
-            return all_docs[:3]  # Return max 3 documents
+            # One embeddings request for all variants, then concurrent over-fetching Pinecone queries
+            embeddings = await vector_service.aembed_queries(variants)
+            results = await vector_service.asearch_candidates_many(embeddings, k=RETRIEVAL_FETCH_K)
+            
+            ranked_lists = [[doc for doc, _ in matches] for matches, _ in results]
+            fused = reciprocal_rank_fusion(ranked_lists, k=RRF_K, limit=RETRIEVAL_FETCH_K, with_scores=True)
+            
+            # Rerank the fused candidates for diversity, with their RRF scores as relevance
+            vectors_by_key = {}
+            for matches, vectors in results:
+                if vectors is not None:
+                    for (doc, _), vector in zip(matches, vectors):
+                        vectors_by_key.setdefault(doc_key(doc), vector)
+            vectors = None
+            if all(doc_key(doc) in vectors_by_key for doc, _ in fused):
+                vectors = np.stack([vectors_by_key[doc_key(doc)] for doc, _ in fused]) if fused else None
+            top_score = fused[0][1] if fused else 1.0
+            return vector_service.diversify(
+                embeddings[0], fused, vectors, k=RETRIEVAL_K,
+                relevance=[score / top_score for _, score in fused]
+            )
         except Exception as e:
             logger.warning(f"Fusion strategy failed, falling back to simple: {str(e)}")
-            return self.simple_strategy(query, llm)
+            RETRIEVAL_FALLBACKS.inc(strategy="fusion")
+            return await self.simple_strategy(query, llm)
 
-    def simple_strategy(self, query, llm):
-        """Optimized direct retrieval"""
-        vector_store = vector_service.get_vector_store()
-        return vector_store.similarity_search(query, k=3)  # Reduced from 5 to 3
+    @staticmethod
+    def _model_name(llm):
+        # get_llm may return the pooled client wrapped in a binding of per-request parameters
+        return getattr(getattr(llm, "bound", llm), "model_name", "unknown")
+    
+    async def simple_strategy(self, query, llm):
+        """Direct retrieval: over-fetch candidates with their vectors and rerank them with MMR"""
+        return await vector_service.amax_marginal_relevance_search(query, k=RETRIEVAL_K, fetch_k=RETRIEVAL_FETCH_K)
+    
+    async def hybrid_strategy(self, query, llm):
+        """Citation-shaped queries resolve from the lexical index; everything else uses dense retrieval"""
+        if self._resolves_lexically(query, "hybrid"):
+            matches = citation_index.search(query, k=RETRIEVAL_FETCH_K)
+            if matches:
+                # BM25 scores as relevance, so the per-judgment cap applies as for dense retrieval
+                return vector_service.diversify(None, matches, None, k=RETRIEVAL_K)
+        return await self.simple_strategy(query, llm)
+    
+    def _resolves_lexically(self, query, strategy):
+        """Whether retrieval will be answered from the citation index without an embedding"""
+        return strategy == "hybrid" and citation_index.ready and is_citation_query(query)
+    
+    def get_retrieval_strategy(self, strategy: str):
+        """Map a request strategy name to its retrieval function (unknown names use simple)"""
+        strategies = {
+            "simple": self.simple_strategy,
+            "fusion": self.fusion_strategy,
+            "hybrid": self.hybrid_strategy
+        }
+        return strategies.get(strategy, self.simple_strategy)
+    
+    async def retrieve(self, query_request: QueryRequest, llm):
+        """Run the request's retrieval strategy, falling back to simple retrieval if it fails"""
+        retrieve_fn = self.get_retrieval_strategy(query_request.strategy)
+        with stage_timer("retrieval"):
+            try:
+                return await retrieve_fn(query_request.query, llm)
+            except Exception as e:
+                logger.warning(f"Error in retrieval: {str(e)}. Falling back to simple strategy.")
+                STAGE_ERRORS.inc(stage="retrieval")
+                RETRIEVAL_FALLBACKS.inc(strategy=query_request.strategy)
+                return await self.simple_strategy(query_request.query, llm)
+    
+    def build_context(self, docs, model_name: str):
+        """Pack retrieved documents into the model's context token budget"""
+        budget = CONTEXT_TOKEN_BUDGETS.get(model_name, CONTEXT_TOKEN_BUDGET)
+        return pack_context(docs, budget, model=model_name)
+    
+    def response_cache_key(self, query_request: QueryRequest):
+        """Response cache key for the request's query and generation parameters"""
+        return redis_service.response_cache_key(
+            query_request.query,
+            query_request.model_name,
+            query_request.strategy,
+            query_request.temperature,
+            query_request.max_tokens
+        )
+    
+    def _semantic_partition(self, query_request: QueryRequest):
+        return semantic_cache.partition_key(
+            query_request.model_name,
+            query_request.strategy,
+            query_request.temperature,
+            query_request.max_tokens,
+            query_request.query
+        )
+    
+    async def semantic_lookup(self, query_request: QueryRequest):
+        """Serve a paraphrased query from the semantic cache after an exact-match miss"""
+        if not SEMANTIC_CACHE_ENABLED or self._resolves_lexically(query_request.query, query_request.strategy):
+            return None  # Citation lookups are cheaper than the embedding a semantic lookup needs
+        
+        try:
+            with stage_timer("semantic_lookup"):
+                partition = self._semantic_partition(query_request)
+                embedding = await vector_service.aembed_query(query_request.query)
+                hit_key = semantic_cache.lookup(partition, embedding)
+                cached = await redis_service.get_cached_response(hit_key) if hit_key else None
+            if hit_key and not cached:
+                semantic_cache.discard(partition, hit_key)
+            CACHE_LOOKUPS.inc(tier="semantic", result="hit" if cached else "miss")
+            return cached
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup failed: {str(e)}")
+            return None
+    
+    async def cache_response(self, query_request: QueryRequest, cache_key: str, response_data: dict):
+        """Fill the exact-match cache (write-behind) and index the query for semantic lookups"""
+        await redis_service.cache_response(cache_key, response_data, defer=True)
+        if not SEMANTIC_CACHE_ENABLED or self._resolves_lexically(query_request.query, query_request.strategy):
+            return
+        
+        try:
+            embedding = await vector_service.aembed_query(query_request.query)
+            semantic_cache.add(self._semantic_partition(query_request), embedding, cache_key)
+        except Exception as e:
+            logger.warning(f"Semantic cache indexing failed: {str(e)}")
+    
+    async def _load_request_state(self, query_request: QueryRequest, conversation_id: str):
+        """Run the pre-generation Redis reads in one pipeline and defer the user message write"""
+        cache_key = self.response_cache_key(query_request)
+        history_messages = CONVERSATION_HISTORY_MESSAGES if query_request.include_history else 0
+        
+        cached, past_messages = await redis_service.prefetch(conversation_id, cache_key, history_messages)
+        
+        conversation_history = ""
+        if past_messages:
+            conversation_history = format_conversation_history(
+                past_messages, max_messages=CONVERSATION_HISTORY_MESSAGES
+            )
+            # The cache key ignores history, so an answer that depends on it is never served from
+            # (or stored in) the caches - it could belong to another conversation
+            cached = None
+        else:
+            CACHE_LOOKUPS.inc(tier="exact", result="hit" if cached else "miss")
+            if not cached:
+                cached = await self.semantic_lookup(query_request)
+        
+        user_message = {
+            "role": "user",
+            "content": query_request.query,
+            "timestamp": time.time()
+        }
+        await redis_service.save_message_to_conversation(conversation_id, user_message, defer=True)
+        
+        return cache_key, cached, conversation_history
+    
+    def _fast_path(self, query_request: QueryRequest):
+        """Route the query; returns (route, request) with the request rewritten for cheaper pipelines"""
+        route = route_query(query_request.query) if FAST_PATH_ENABLED else None
+        if route and route.strategy and route.strategy != query_request.strategy:
+            query_request = query_request.model_copy(update={"strategy": route.strategy})
+        return route, query_request
+    
+    async def _answer_fast_path(self, route, query_request: QueryRequest, conversation_id: str, start_time: float):
+        """Record a precomputed answer in the conversation and build its response dict"""
+        user_message = {
+            "role": "user",
+            "content": query_request.query,
+            "timestamp": time.time()
+        }
+        await redis_service.save_message_to_conversation(conversation_id, user_message, defer=True)
+        await self._save_assistant_message(conversation_id, route.response)
+        FAST_PATH_ANSWERS.inc(kind=route.kind)
+        
+        return {
+            "response": route.response,
+            "metadata": {
+                "model": f"fast-path-{route.kind}",
+                "strategy": "direct",
+                "chunks_retrieved": 0,
+                "tokens_used": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "processing_time": round(time.time() - start_time, 2),
+                "conversation_id": conversation_id
+            },
+            "context_sources": []
+        }
+    
+    async def _save_assistant_message(self, conversation_id: str, content: str):
+        assistant_message = {
+            "role": "assistant",
+            "content": content,
+            "timestamp": time.time()
+        }
+        await redis_service.save_message_to_conversation(conversation_id, assistant_message, defer=True)
     
     async def process_query(self, query_request: QueryRequest):
         """Process a query with improved error handling and conversation management"""
+        debug = query_request.debug and TRACE_REQUESTS_ENABLED
+        with request_trace(debug, profile=query_request.profile) as trace:
+            response = await self._process_query(query_request)
+        if trace:
+            response.metadata.trace = dict(trace.to_dict(), server_timing=trace.server_timing())
+        return response
+    
+    async def _process_query(self, query_request: QueryRequest):
         start_time = time.time()
         
         conversation_id = query_request.conversation_id or str(uuid.uuid4())
+        flight = None
+        outcome = "error"
         
         try:
-            user_message = {
-                "role": "user",
-                "content": query_request.query,
-                "timestamp": time.time()
-            }
-            await redis_service.save_message_to_conversation(conversation_id, user_message)
-            
-            if not query_request.stream:
-                cached = await redis_service.get_cached_response(
-                    query_request.query, 
-                    query_request.model_name,
-                    query_request.strategy
-                )
-                if cached:
-                    cached["metadata"]["conversation_id"] = conversation_id
-                    
-                    assistant_message = {
-                        "role": "assistant",
-                        "content": cached["response"],
-                        "timestamp": time.time()
-                    }
-                    await redis_service.save_message_to_conversation(conversation_id, assistant_message)
-                    
-                    return QueryResponse(**cached)
-            
-            llm = self.get_llm(query_request.model_name, streaming=query_request.stream)
-            llm.temperature = query_request.temperature
-            llm.max_tokens = query_request.max_tokens
-            
-            conversation_history = ""
-            if query_request.include_history:
-                past_messages = await redis_service.get_conversation(conversation_id)
-                if len(past_messages) > 1:
-                    conversation_history = format_conversation_history(past_messages[:-1])
-            
-            if is_simple_greeting(query_request.query):
-                greeting_response = get_greeting_response(query_request.query)
-                
-                assistant_message = {
-                    "role": "assistant",
-                    "content": greeting_response,
-                    "timestamp": time.time()
-                }
-                await redis_service.save_message_to_conversation(conversation_id, assistant_message)
-                
-                duration = time.time() - start_time
-                
-                response = QueryResponse(
-                    response=greeting_response,
-                    metadata=ResponseMetadata(
-                        model="fast-path-greeting",
-                        strategy="direct",
-                        chunks_retrieved=0,
-                        tokens_used=0,
-                        processing_time=round(duration, 2),
-                        conversation_id=conversation_id
-                    ),
-                    context_sources=[]
-                )
-                
-                return response
-                
-            retrieve_fn = self.fusion_strategy if query_request.strategy == "fusion" else self.simple_strategy
+            # Greetings, thanks and questions about NyayaGPT never reach Redis reads or the LLM
+            route, query_request = self._fast_path(query_request)
+            if route and route.response:
+                result = await self._answer_fast_path(route, query_request, conversation_id, start_time)
+                outcome = "fast_path"
+                return QueryResponse(**result)
+            
+            cache_key, cached, conversation_history = await self._load_request_state(
+                query_request, conversation_id
+            )
+            if cached:
+                cached["metadata"]["conversation_id"] = conversation_id
+                cached["metadata"]["cached"] = True
+                await self._save_assistant_message(conversation_id, cached["response"])
+                outcome = "cached"
+                return QueryResponse(**cached)
+            
+            llm = self.get_llm(
+                query_request.model_name,
+                streaming=query_request.stream,
+                temperature=query_request.temperature,
+                max_tokens=query_request.max_tokens
+            )
             
-            try:
-                docs = retrieve_fn(query_request.query, llm)
-            except Exception as e:
-                logger.warning(f"Error in retrieval: {str(e)}. Falling back to simple strategy.")
-                docs = self.simple_strategy(query_request.query, llm)
-                
-            # Format documents and create context (optimized for speed)
-            context = format_docs(docs, max_length=300)
+            # Identical queries already being answered share the leader's result (unless the answer
+            # depends on this conversation's history, which the key does not cover)
+            follower = None
+            if not conversation_history:
+                flight, follower = await request_coalescer.join(cache_key)
+            if follower:
+                result = await follower.result()
+                if result:
+                    # The leader's result is shared by every follower - never modify it in place
+                    result = dict(result, metadata=dict(result["metadata"], conversation_id=conversation_id))
+                    await self._save_assistant_message(conversation_id, result["response"])
+                    outcome = "coalesced"
+                    return QueryResponse(**result)
+            
+            docs = await self.retrieve(query_request, llm)
+            context = self.build_context(docs, query_request.model_name)
             
             # Create prompt with history  
             prompt = final_prompt.format(
@@ -174,19 +395,24 @@ class LLMService:
                 context=context, 
                 question=query_request.query
             )
-            
-            # Skip token counting for speed
-            tokens_used = len(prompt) // 4
-            
-            parser = StrOutputParser()
-            answer = (llm | parser).invoke(prompt)
-            
-            assistant_message = {
-                "role": "assistant",
-                "content": answer,
-                "timestamp": time.time()
-            }
-            await redis_service.save_message_to_conversation(conversation_id, assistant_message)
+            annotate(docs_retrieved=len(docs), context_chars=len(context), prompt_chars=len(prompt))
+            
+            usage = TokenUsage(query_request.model_name)
+            with stage_timer("generation"):
+                if hedger.enabled:
+                    # Streamed internally so a late first token can be hedged
+                    answer = "".join([
+                        chunk async for chunk in self._stream_text(self._generation_stream(query_request, prompt, usage), usage)
+                    ])
+                else:
+                    message = await llm.ainvoke(prompt)
+                    usage.observe(message)
+                    answer = message.content
+            await usage.finish(prompt, answer)
+            GENERATION_SECONDS.observe(usage.duration, model=usage.model_name)
+            annotate(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+            
+            await self._save_assistant_message(conversation_id, answer)
             
             sources = [
                 {
@@ -202,115 +428,280 @@ class LLMService:
             response = QueryResponse(
                 response=answer,
                 metadata=ResponseMetadata(
-                    model=query_request.model_name,
+                    model=usage.model_name,
                     strategy=query_request.strategy,
                     chunks_retrieved=len(docs),
-                    tokens_used=tokens_used,
+                    **usage.metadata(),
                     processing_time=round(duration, 2),
                     conversation_id=conversation_id
                 ),
                 context_sources=sources
             )
             
-            if not query_request.stream:
-                await redis_service.cache_response(
-                    query_request.query,
-                    query_request.model_name,
-                    query_request.strategy,
-                    response.dict()
-                )
+            # Never cache a fallback model's answer, or one that depends on conversation history
+            if usage.model_name == query_request.model_name and not conversation_history:
+                await self.cache_response(query_request, cache_key, response.dict())
+            if flight:
+                flight.finish(response.dict())
             
+            outcome = "generated"
             return response
             
         except Exception as e:
             logger.error(f"Error processing query: {str(e)}")
             raise
+        finally:
+            if flight:
+                request_coalescer.release(flight)
+            REQUEST_SECONDS.observe(time.time() - start_time, mode="json", outcome=outcome)
+            annotate(outcome=outcome)
+    
+    async def process_batch(self, query_requests: List[QueryRequest], max_concurrency: Optional[int] = None,
+                            client_id: str = "unknown"):
+        """Answer many queries, yielding {"index", "response"|"error"} items as each one finishes.
+        
+        Identical queries run once, embeddings are requested in batches ahead of retrieval and
+        generation runs under a per-model concurrency limit. Every unique generation is charged to the
+        client's batch rate limit and holds a model slot, waiting up to BATCH_ADMISSION_TIMEOUT for
+        both; items still not admitted by then are returned as errors.
+        """
+        groups = {}
+        for index, query_request in enumerate(query_requests):
+            query_request.stream = False
+            groups.setdefault(self.response_cache_key(query_request), []).append(index)
+        unique = list(groups.values())
+        
+        limit = min(max_concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)
+        semaphores = {}
+        for query_request in query_requests:
+            semaphores.setdefault(query_request.model_name, asyncio.Semaphore(limit))
+        
+        async def run(indexes):
+            query_request = query_requests[indexes[0]]
+            async with semaphores[query_request.model_name]:
+                try:
+                    # One charge per generation: deduplicated copies cost the provider nothing
+                    permit = await admission_controller.admit_batch_item(
+                        client_id, query_request.model_name, time.monotonic() + BATCH_ADMISSION_TIMEOUT
+                    )
+                except AdmissionRejected as e:
+                    return indexes, None, f"{e.reason} (retry after {e.retry_after}s)"
+                try:
+                    response = await self.process_query(query_request)
+                    return indexes, response.dict(exclude_none=True), None
+                except Exception as e:
+                    return indexes, None, str(e)
+                finally:
+                    permit.release()
+        
+        def results(task):
+            indexes, response, error = task.result()
+            for index in indexes:
+                if error is not None:
+                    yield {"index": index, "error": error}
+                    continue
+                item = dict(response, metadata=dict(response["metadata"]))
+                if query_requests[index].conversation_id:
+                    item["metadata"]["conversation_id"] = query_requests[index].conversation_id
+                yield {"index": index, "response": item}
+        
+        pending = set()
+        try:
+            for start in range(0, len(unique), EMBEDDING_BATCH_SIZE):
+                wave = unique[start:start + EMBEDDING_BATCH_SIZE]
+                try:
+                    # Warm the embedding cache so each item's retrieval skips its own embeddings call
+                    queries = []
+                    for indexes in wave:
+                        route, query_request = self._fast_path(query_requests[indexes[0]])
+                        if not (route and route.response):
+                            queries.append(query_request.query)
+                    await vector_service.aembed_queries(queries)
+                except Exception as e:
+                    logger.warning(f"Batch embedding failed, items will embed individually: {str(e)}")
+                pending.update(asyncio.create_task(run(indexes)) for indexes in wave)
+                
+                for task in [task for task in pending if task.done()]:
+                    pending.discard(task)
+                    for item in results(task):
+                        yield item
+            
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    for item in results(task):
+                        yield item
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def _replay_chunks(self, answer: str):
+        for i in range(0, len(answer), STREAM_REPLAY_CHUNK_SIZE):
+            yield answer[i:i + STREAM_REPLAY_CHUNK_SIZE]
+            await asyncio.sleep(0)  # Let the server flush each frame
+    
+    async def _replay_cached_response(self, sse: SSEStream, cached: dict, conversation_id: str, start_time: float):
+        """Replay a cached answer as progressive SSE chunks followed by the usual done frame"""
+        answer = cached["response"]
+        async for event in sse.frames(self._replay_chunks(answer)):
+            yield event
+        
+        await self._save_assistant_message(conversation_id, answer)
+        
+        metadata = dict(cached["metadata"])
+        metadata.update(
+            conversation_id=conversation_id,
+            processing_time=round(time.time() - start_time, 2),
+            cached=True
+        )
+        completion_data = {
+            "done": True,
+            "metadata": metadata,
+            "context_sources": cached.get("context_sources", [])
+        }
+        
+        yield sse.done(completion_data)
+    
+    def _generation_stream(self, query_request: QueryRequest, prompt, usage: TokenUsage):
+        """Answer message chunks from the requested model, hedged against a late first token"""
+        def start(model_name):
+            llm = self.get_llm(
+                model_name,
+                streaming=True,
+                temperature=query_request.temperature,
+                max_tokens=query_request.max_tokens
+            )
+            return llm.astream(prompt)
+        
+        return hedger.stream(start, prompt, usage)
+    
+    async def _stream_text(self, messages, usage: TokenUsage):
+        """Turn streamed message chunks into text, picking up usage from the final chunk"""
+        first = True
+        async for message in messages:
+            usage.observe(message)
+            if message.content:
+                if first:
+                    ttft = time.perf_counter() - usage.started
+                    TTFT_SECONDS.observe(ttft, model=usage.model_name)
+                    annotate(ttft_ms=round(ttft * 1000, 1))
+                    first = False
+                yield message.content
+    
+    async def _publish_chunks(self, chunks, flight):
+        """Pass generated chunks through while fanning them out to coalesced followers"""
+        async for chunk in chunks:
+            if flight:
+                flight.publish(chunk)
+            yield chunk
+    
+    async def _follow_leader(self, sse: SSEStream, follower, conversation_id: str, start_time: float):
+        """Stream a coalesced leader's answer, then the done frame built from its result"""
+        async for event in sse.frames(follower.chunks()):
+            yield event
+        
+        result = follower.final
+        if not result:
+            raise FlightAbandoned("Leader finished without a result")
+        
+        # A non-streaming leader publishes no chunks, so replay whatever the follower has not seen
+        answer = result["response"]
+        if len(sse.full) < len(answer):
+            async for event in sse.frames(self._replay_chunks(answer[len(sse.full):])):
+                yield event
+        
+        await self._save_assistant_message(conversation_id, answer)
+        
+        metadata = dict(result["metadata"])
+        metadata.update(conversation_id=conversation_id, processing_time=round(time.time() - start_time, 2))
+        yield sse.done({
+            "done": True,
+            "metadata": metadata,
+            "context_sources": result.get("context_sources", [])
+        })
     
     async def generate_streaming_response(self, query_request: QueryRequest) -> AsyncGenerator[str, None]:
         """Generate a streaming response for the query with improved error handling."""
+        debug = query_request.debug and TRACE_REQUESTS_ENABLED
+        with request_trace(debug, profile=query_request.profile):
+            async for event in self._generate_streaming_response(query_request):
+                yield event
+    
+    async def _generate_streaming_response(self, query_request: QueryRequest) -> AsyncGenerator[str, None]:
         start_time = time.time()
         
         conversation_id = query_request.conversation_id or str(uuid.uuid4())
+        sse = SSEStream(query_request.stream_protocol, trace=current_trace())
+        flight = None
+        outcome = "aborted"  # Client went away before the done frame
         
         try:
-            user_message = {
-                "role": "user",
-                "content": query_request.query,
-                "timestamp": time.time()
-            }
-            await redis_service.save_message_to_conversation(conversation_id, user_message)
-            
-            llm = self.get_llm(query_request.model_name, streaming=True)
-            llm.temperature = query_request.temperature
-            llm.max_tokens = query_request.max_tokens
-            
-            conversation_history = ""
-            if query_request.include_history:
-                past_messages = await redis_service.get_conversation(conversation_id)
-                if len(past_messages) > 1:
-                    conversation_history = format_conversation_history(past_messages[:-1])
-            
-            if is_simple_greeting(query_request.query):
-                greeting_response = get_greeting_response(query_request.query)
-                
-                yield f"data: {json.dumps({'chunk': greeting_response, 'full': greeting_response})}\n\n"
-                
-                assistant_message = {
-                    "role": "assistant",
-                    "content": greeting_response,
-                    "timestamp": time.time()
-                }
-                await redis_service.save_message_to_conversation(conversation_id, assistant_message)
-                
-                duration = time.time() - start_time
-                
-                completion_data = {
+            route, query_request = self._fast_path(query_request)
+            if route and route.response:
+                result = await self._answer_fast_path(route, query_request, conversation_id, start_time)
+                yield sse.message(result["response"])
+                yield sse.done({
                     "done": True,
-                    "metadata": {
-                        "model": "fast-path-greeting",
-                        "strategy": "direct",
-                        "chunks_retrieved": 0,
-                        "tokens_used": 0,
-                        "processing_time": round(duration, 2),
-                        "conversation_id": conversation_id
-                    },
-                    "context_sources": []
-                }
-                
-                yield f"data: {json.dumps(completion_data)}\n\n"
+                    "metadata": result["metadata"],
+                    "context_sources": result["context_sources"]
+                })
+                outcome = "fast_path"
                 return
-                
-            retrieve_fn = self.fusion_strategy if query_request.strategy == "fusion" else self.simple_strategy
             
-            try:
-                docs = retrieve_fn(query_request.query, llm)
-            except Exception as e:
-                logger.warning(f"Error in retrieval: {str(e)}. Falling back to simple strategy.")
-                docs = self.simple_strategy(query_request.query, llm)
-                
-            context = format_docs(docs, max_length=600)
+            cache_key, cached, conversation_history = await self._load_request_state(
+                query_request, conversation_id
+            )
+            if cached:
+                async for event in self._replay_cached_response(sse, cached, conversation_id, start_time):
+                    yield event
+                outcome = "cached"
+                return
+            
+            llm = self.get_llm(
+                query_request.model_name,
+                streaming=True,
+                temperature=query_request.temperature,
+                max_tokens=query_request.max_tokens
+            )
+            
+            # Identical queries already being answered subscribe to the leader's live stream (unless
+            # the answer depends on this conversation's history, which the key does not cover)
+            follower = None
+            if not conversation_history:
+                flight, follower = await request_coalescer.join(cache_key)
+            if follower:
+                try:
+                    async for event in self._follow_leader(sse, follower, conversation_id, start_time):
+                        yield event
+                    outcome = "coalesced"
+                    return
+                except FlightAbandoned:
+                    if sse.full:
+                        raise
+                    logger.info("Coalesced leader went away, running the query independently")
+            
+            docs = await self.retrieve(query_request, llm)
+            context = self.build_context(docs, query_request.model_name)
         
             prompt = final_prompt.format(
                 history=conversation_history,
                 context=context, 
                 question=query_request.query
             )
+            annotate(docs_retrieved=len(docs), context_chars=len(context), prompt_chars=len(prompt))
             
-            tokens_used = count_tokens(prompt, query_request.model_name)
+            usage = TokenUsage(query_request.model_name)
+            chunks = self._stream_text(self._generation_stream(query_request, prompt, usage), usage)
             
-            chain = llm | StrOutputParser()
+            with stage_timer("generation"):
+                async for event in sse.frames(self._publish_chunks(chunks, flight)):
+                    yield event
+            full_response = sse.full
+            await usage.finish(prompt, full_response)
+            GENERATION_SECONDS.observe(usage.duration, model=usage.model_name)
+            annotate(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
             
-            full_response = ""
-            async for chunk in chain.astream(prompt):
-                full_response += chunk
-                yield f"data: {json.dumps({'chunk': chunk, 'full': full_response})}\n\n"
-            
-            assistant_message = {
-                "role": "assistant",
-                "content": full_response,
-                "timestamp": time.time()
-            }
-            await redis_service.save_message_to_conversation(conversation_id, assistant_message)
+            await self._save_assistant_message(conversation_id, full_response)
             
             duration = time.time() - start_time
             
@@ -326,25 +717,34 @@ class LLMService:
             completion_data = {
                 "done": True,
                 "metadata": {
-                    "model": query_request.model_name,
+                    "model": usage.model_name,
                     "strategy": query_request.strategy,
                     "chunks_retrieved": len(docs),
-                    "tokens_used": tokens_used,
+                    **usage.metadata(),
                     "processing_time": round(duration, 2),
                     "conversation_id": conversation_id
                 },
                 "context_sources": sources
             }
             
-            yield f"data: {json.dumps(completion_data)}\n\n"
+            result = {"response": full_response, "metadata": completion_data["metadata"], "context_sources": sources}
+            if flight:
+                flight.finish(result)
+            
+            yield sse.done(completion_data)
+            outcome = "generated"
+            
+            if full_response and usage.model_name == query_request.model_name and not conversation_history:
+                await self.cache_response(query_request, cache_key, result)
             
         except Exception as e:
             logger.error(f"Error in streaming response: {str(e)}")
+            outcome = "error"
             error_data = {
                 "error": str(e),
                 "full": f"I apologize, but I encountered an error while processing your request. Please try again or contact support if the issue persists."
             }
-            yield f"data: {json.dumps(error_data)}\n\n"
+            yield sse.error(error_data)
             
             completion_data = {
                 "done": True,
@@ -353,6 +753,8 @@ class LLMService:
                     "strategy": query_request.strategy,
                     "chunks_retrieved": 0,
                     "tokens_used": 0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
                     "processing_time": round(time.time() - start_time, 2),
                     "conversation_id": conversation_id
                 },
@@ -360,7 +762,12 @@ class LLMService:
                 "error": str(e)
             }
             
-            yield f"data: {json.dumps(completion_data)}\n\n"
+            yield sse.done(completion_data)
+        finally:
+            if flight:
+                request_coalescer.release(flight)
+            REQUEST_SECONDS.observe(time.time() - start_time, mode="stream", outcome=outcome)
+            annotate(outcome=outcome)
 
 # Global LLM service instance
 llm_service = LLMService()
\ No newline at end of file
@@ -1,15 +1,215 @@
 import json
 import time
+import asyncio
+import hashlib
 import logging
 import redis.asyncio as redis_async
-from fastapi_limiter import FastAPILimiter
-from app.config import REDIS_HOST, REDIS_PORT, REDIS_PASSWORD, REDIS_DB, REDIS_TTL, CACHE_TTL
+from app.config import (
+    REDIS_HOST, REDIS_PORT, REDIS_PASSWORD, REDIS_DB, REDIS_TTL, CACHE_TTL, EMBEDDING_CACHE_TTL,
+    CACHE_SCHEMA_VERSION, PINECONE_INDEX_NAME, CONVERSATION_MAX_MESSAGES,
+    WRITE_BEHIND_MAX_PENDING, WRITE_BEHIND_BATCH_SIZE, USAGE_WORKER_TTL, WORKER_ID,
+    METRICS_PUSH_INTERVAL, METRICS_STALE_AFTER
+)
+from app.utils.helpers import normalize_query
+from app.utils.metrics import metrics, stage_timer
+from app.utils.prompts import PROMPT_VERSION
 
 logger = logging.getLogger("NyayaGPT-API")
 
+# Token buckets charged atomically: either every bucket in KEYS holds `cost` tokens and all are
+# charged, or none is and the reply is how long (ms) until the scarcest one has refilled enough.
+# ARGV: cost, then capacity and refill-per-second for each key. Redis' clock is shared by all workers.
+TOKEN_BUCKET_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local cost = tonumber(ARGV[1])
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+    tokens = math.min(capacity, tokens + elapsed / 1000 * rate)
+    levels[i] = tokens
+    if tokens < cost then
+        wait = math.max(wait, (cost - tokens) / rate * 1000)
+    end
+end
+if wait > 0 then
+    return {0, math.ceil(wait)}
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - cost), 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000) + 1000)
+end
+return {1, 0}
+"""
+
+# Moves a legacy conv:{id} JSON blob into the front of the convlog:{id} list, provided the blob is
+# still the one the caller read (ARGV[1]), so concurrent readers migrate it at most once.
+# ARGV: blob, max messages, TTL seconds, then the blob's messages as JSON strings, oldest first.
+MIGRATE_CONVERSATION_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+for i = #ARGV, 4, -1 do
+    redis.call('LPUSH', KEYS[2], ARGV[i])
+end
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+redis.call('DEL', KEYS[1])
+return 1
+"""
+
+class WriteBehindQueue:
+    """Bounded queue of deferred Redis writes, flushed in pipelined batches by one background task"""
+    
+    def __init__(self, service, max_pending=WRITE_BEHIND_MAX_PENDING, batch_size=WRITE_BEHIND_BATCH_SIZE):
+        self.service = service
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self._queue = None
+        self._task = None
+    
+    def start(self):
+        """Start the flusher task (called from the app lifespan once Redis is up)"""
+        if self._task:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.create_task(self._run())
+        logger.info("Redis write-behind flusher started")
+    
+    def submit(self, add_commands, binary=False):
+        """Queue a write; returns False when the caller should write inline instead"""
+        if not self._task or self._task.done():
+            return False
+        try:
+            self._queue.put_nowait((add_commands, binary))
+            return True
+        except asyncio.QueueFull:
+            logger.warning("Write-behind queue full - writing inline")
+            return False
+    
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    async def _flush(self, batch):
+        for binary in (False, True):
+            ops = [add_commands for add_commands, is_binary in batch if is_binary == binary]
+            client = self.service.binary_client if binary else self.service.client
+            if not ops or not client:
+                continue
+            try:
+                with stage_timer("redis_write"):
+                    async with client.pipeline(transaction=False) as pipe:
+                        for add_commands in ops:
+                            add_commands(pipe)
+                        await pipe.execute()
+            except Exception as e:
+                logger.error(f"Error flushing {len(ops)} deferred Redis writes: {str(e)}")
+    
+    async def drain(self, timeout=10):
+        """Flush everything still queued and stop the flusher (called on shutdown)"""
+        if not self._task:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Write-behind drain timed out with {self._queue.qsize()} writes pending")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Redis write-behind flusher stopped")
+
+class MetricsPublisher:
+    """Periodically shares this worker's metrics snapshot so any worker can serve /metrics for all"""
+    
+    key = "metrics:workers"
+    
+    def __init__(self, service, interval=METRICS_PUSH_INTERVAL, stale_after=METRICS_STALE_AFTER):
+        self.service = service
+        self.interval = interval
+        self.stale_after = stale_after
+        self._task = None
+    
+    def start(self):
+        if self._task:
+            return
+        self._task = asyncio.create_task(self._run())
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.publish()
+    
+    async def publish(self):
+        if not self.service.client:
+            return
+        try:
+            payload = json.dumps({"ts": time.time(), "metrics": metrics.snapshot()})
+            await self.service.client.hset(self.key, WORKER_ID, payload)
+        except Exception as e:
+            logger.warning(f"Error publishing metrics snapshot: {str(e)}")
+    
+    async def collect(self):
+        """Snapshots of every live worker, with this worker's taken fresh"""
+        snapshots = [metrics.snapshot()]
+        if not self.service.client:
+            return snapshots
+        
+        try:
+            stale = []
+            for worker, payload in (await self.service.client.hgetall(self.key)).items():
+                entry = json.loads(payload)
+                if worker == WORKER_ID:
+                    continue
+                if time.time() - entry["ts"] > self.stale_after:
+                    stale.append(worker)
+                    continue
+                snapshots.append(entry["metrics"])
+            if stale:
+                await self.service.client.hdel(self.key, *stale)
+        except Exception as e:
+            logger.warning(f"Error collecting worker metrics: {str(e)}")
+        return snapshots
+    
+    async def stop(self):
+        """Stop publishing, leaving a final snapshot behind until it goes stale"""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.publish()
+
 class RedisService:
     def __init__(self):
         self.client = None
+        self.binary_client = None  # Raw bytes client for packed embedding vectors
+        self.write_behind = WriteBehindQueue(self)
+        self.metrics_publisher = MetricsPublisher(self)
+        self._token_bucket = None
+        # Versioned namespace: editing a prompt or switching index makes old entries unreachable
+        index_version = hashlib.sha256(PINECONE_INDEX_NAME.encode("utf-8")).hexdigest()[:8]
+        self.cache_namespace = f"cache:{CACHE_SCHEMA_VERSION}:{PROMPT_VERSION}:{index_version}"
     
     async def init_redis(self):
         """Initialize Redis connection with improved error handling for GCP"""
@@ -29,12 +229,18 @@ class RedisService:
                 health_check_interval=30
             )
             
+            self.binary_client = redis_async.from_url(
+                redis_url,
+                decode_responses=False,
+                socket_connect_timeout=5,
+                socket_timeout=5,
+                retry_on_timeout=True,
+                health_check_interval=30
+            )
+            
             # Test connection
             await self.client.ping()
             
-            # Initialize rate limiter only if Redis is working
-            await FastAPILimiter.init(self.client)
-            
             logger.info("Redis connection established")
             return self.client
         except Exception as e:
@@ -43,44 +249,111 @@ class RedisService:
     
     async def close(self):
         """Close Redis connection"""
+        if self.binary_client:
+            await self.binary_client.close()
         if self.client:
             await self.client.close()
             logger.info("Redis connection closed")
     
-    async def get_conversation(self, conversation_id):
-        """Get conversation history from Redis with error handling"""
+    def _add_history_commands(self, pipe, conversation_id, last_n):
+        start = -last_n if last_n else 0
+        pipe.lrange(f"convlog:{conversation_id}", start, -1)
+        pipe.get(f"conv:{conversation_id}")  # Legacy JSON blob written before the append-only log
+    
+    def _parse_history(self, conversation_id, entries, legacy, last_n):
+        messages = [json.loads(entry) for entry in entries]
+        if legacy:
+            legacy_messages = json.loads(legacy)
+            self._migrate_legacy(conversation_id, legacy, legacy_messages)
+            messages = legacy_messages + messages
+            if last_n:
+                messages = messages[-last_n:]
+        return messages
+    
+    def _add_migrate_commands(self, pipe, conversation_id, legacy, legacy_messages):
+        pipe.eval(
+            MIGRATE_CONVERSATION_SCRIPT, 2, f"conv:{conversation_id}", f"convlog:{conversation_id}",
+            legacy, CONVERSATION_MAX_MESSAGES, REDIS_TTL, *(json.dumps(message) for message in legacy_messages)
+        )
+    
+    def _migrate_legacy(self, conversation_id, legacy, legacy_messages):
+        """Fold a legacy blob into the append-only log on first read, so it is read only once"""
+        add_commands = lambda pipe: self._add_migrate_commands(pipe, conversation_id, legacy, legacy_messages)
+        if not self.write_behind.submit(add_commands):
+            asyncio.create_task(self._migrate_inline(add_commands))
+    
+    async def _migrate_inline(self, add_commands):
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                add_commands(pipe)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error migrating legacy conversation: {str(e)}")
+    
+    async def get_conversation(self, conversation_id, last_n=None):
+        """Get conversation history (optionally only the last N messages) with error handling"""
         if not self.client:
             logger.warning("Redis client not initialized - returning empty conversation history")
             return []
         
         try:
-            conversation_data = await self.client.get(f"conv:{conversation_id}")
-            if conversation_data:
-                return json.loads(conversation_data)
-            return []
+            async with self.client.pipeline(transaction=False) as pipe:
+                self._add_history_commands(pipe, conversation_id, last_n)
+                entries, legacy = await pipe.execute()
+            return self._parse_history(conversation_id, entries, legacy, last_n)
         except Exception as e:
             logger.error(f"Error retrieving conversation: {str(e)}")
             return []
+    
+    async def prefetch(self, conversation_id, cache_key, history_messages=0):
+        """Fetch the cached response and recent history for a request in one round trip"""
+        if not self.client:
+            return None, []
+        
+        try:
+            with stage_timer("redis_prefetch"):
+                async with self.client.pipeline(transaction=False) as pipe:
+                    pipe.get(cache_key)
+                    if history_messages:
+                        self._add_history_commands(pipe, conversation_id, history_messages)
+                    results = await pipe.execute()
+            
+            cached = json.loads(results[0]) if results[0] else None
+            if cached:
+                logger.info(f"Cache hit for key: {cache_key}")
+            history = self._parse_history(conversation_id, results[1], results[2], history_messages) if history_messages else []
+            return cached, history
+        except Exception as e:
+            logger.error(f"Error prefetching request state: {str(e)}")
+            return None, []
+    
+    def _add_message_commands(self, pipe, conversation_id, message):
+        key = f"convlog:{conversation_id}"
+        pipe.rpush(key, json.dumps(message))
+        pipe.ltrim(key, -CONVERSATION_MAX_MESSAGES, -1)
+        pipe.expire(key, REDIS_TTL)
 
-    async def save_message_to_conversation(self, conversation_id, message):
-        """Save a single message to the conversation history with error handling"""
+    async def save_message_to_conversation(self, conversation_id, message, defer=False):
+        """Append a message to the conversation log, trim it and refresh its TTL.
+        
+        With defer=True the write goes through the write-behind queue instead of the request path.
+        """
         if not self.client:
             logger.warning("Redis client not initialized - skipping message save")
             return
         
+        if "timestamp" not in message:
+            message["timestamp"] = time.time()
+        
+        if defer and self.write_behind.submit(
+            lambda pipe: self._add_message_commands(pipe, conversation_id, message)
+        ):
+            return
+        
         try:
-            conversation = await self.get_conversation(conversation_id)
-            
-            if "timestamp" not in message:
-                message["timestamp"] = time.time()
-            
-            conversation.append(message)
-            
-            await self.client.setex(
-                f"conv:{conversation_id}", 
-                REDIS_TTL, 
-                json.dumps(conversation)
-            )
+            async with self.client.pipeline(transaction=True) as pipe:
+                self._add_message_commands(pipe, conversation_id, message)
+                await pipe.execute()
         except Exception as e:
             logger.error(f"Error saving message to conversation: {str(e)}")
     
@@ -90,45 +363,151 @@ class RedisService:
             raise Exception("Redis client not initialized")
         
         try:
-            deleted = await self.client.delete(f"conv:{conversation_id}")
+            deleted = await self.client.delete(f"convlog:{conversation_id}", f"conv:{conversation_id}")
             return deleted > 0
         except Exception as e:
             logger.error(f"Error deleting conversation: {str(e)}")
             raise
     
-    async def get_cached_response(self, query: str, model_name: str, strategy: str):
+    def response_cache_key(self, query: str, model_name: str, strategy: str,
+                           temperature: float, max_tokens: int) -> str:
+        """Stable, content-addressed cache key shared by all workers and restarts"""
+        payload = json.dumps(
+            [normalize_query(query), model_name, strategy, round(float(temperature), 3), int(max_tokens)],
+            separators=(",", ":")
+        )
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return f"{self.cache_namespace}:{digest}"
+    
+    async def get_cached_response(self, cache_key: str):
         """Get cached response if available with error handling"""
         if not self.client:
             return None
         
         try:
-            cache_key = f"cache:{hash(f'{query}:{model_name}:{strategy}')}"
-            cached = await self.client.get(cache_key)
+            with stage_timer("redis_cache_read"):
+                cached = await self.client.get(cache_key)
             
             if cached:
-                logger.info(f"Cache hit for query: {query[:30]}...")
+                logger.info(f"Cache hit for key: {cache_key}")
                 return json.loads(cached)
             return None
         except Exception as e:
             logger.error(f"Error retrieving from cache: {str(e)}")
             return None
 
-    async def cache_response(self, query: str, model_name: str, strategy: str, response_data: dict):
+    async def cache_response(self, cache_key: str, response_data: dict, defer=False):
         """Cache response for future use with error handling"""
         if not self.client:
             return
         
+        payload = json.dumps(response_data)
+        if defer and self.write_behind.submit(lambda pipe: pipe.setex(cache_key, CACHE_TTL, payload)):
+            return
+        
         try:
-            cache_key = f"cache:{hash(f'{query}:{model_name}:{strategy}')}"
-            await self.client.setex(
-                cache_key,
-                CACHE_TTL,
-                json.dumps(response_data)
-            )
-            logger.info(f"Cached response for query: {query[:30]}...")
+            with stage_timer("redis_write"):
+                await self.client.setex(cache_key, CACHE_TTL, payload)
+            logger.info(f"Cached response under key: {cache_key}")
         except Exception as e:
             logger.error(f"Error caching response: {str(e)}")
     
+    async def get_embeddings(self, keys):
+        """Fetch packed embedding vectors for several keys in one round trip"""
+        if not self.binary_client or not keys:
+            return [None] * len(keys)
+        
+        try:
+            with stage_timer("embedding_cache_read"):
+                return await self.binary_client.mget(keys)
+        except Exception as e:
+            logger.error(f"Error retrieving embeddings: {str(e)}")
+            return [None] * len(keys)
+    
+    def _add_embedding_commands(self, pipe, packed_vectors):
+        for key, packed in packed_vectors.items():
+            pipe.setex(key, EMBEDDING_CACHE_TTL, packed)
+    
+    async def cache_embeddings(self, packed_vectors: dict, defer=False):
+        """Store packed embedding vectors keyed by embedding cache key"""
+        if not self.binary_client or not packed_vectors:
+            return
+        
+        if defer and self.write_behind.submit(
+            lambda pipe: self._add_embedding_commands(pipe, packed_vectors), binary=True
+        ):
+            return
+        
+        try:
+            async with self.binary_client.pipeline(transaction=False) as pipe:
+                self._add_embedding_commands(pipe, packed_vectors)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error caching embeddings: {str(e)}")
+    
+    def _add_usage_commands(self, pipe, model_name, counters):
+        for key in (f"usage:{model_name}", f"usage:{model_name}:{WORKER_ID}"):
+            for field, value in counters.items():
+                pipe.hincrby(key, field, int(value))
+        pipe.expire(f"usage:{model_name}:{WORKER_ID}", USAGE_WORKER_TTL)
+    
+    async def record_usage(self, model_name: str, counters: dict):
+        """Add to the per-model and per-worker token usage counters (written behind the request)"""
+        if not self.client:
+            return
+        
+        if self.write_behind.submit(lambda pipe: self._add_usage_commands(pipe, model_name, counters)):
+            return
+        
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                self._add_usage_commands(pipe, model_name, counters)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error recording token usage: {str(e)}")
+    
+    async def get_usage(self):
+        """Read every usage counter hash, keyed by model and then by worker"""
+        if not self.client:
+            raise Exception("Redis client not initialized")
+        
+        keys = [key async for key in self.client.scan_iter(match="usage:*", count=500)]
+        if not keys:
+            return {}
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.hgetall(key)
+            hashes = await pipe.execute()
+        
+        usage = {}
+        for key, counters in zip(keys, hashes):
+            _, model_name, *worker = key.split(":", 2)
+            entry = usage.setdefault(model_name, {"total": {}, "workers": {}})
+            counters = {field: int(value) for field, value in counters.items()}
+            if worker:
+                entry["workers"][worker[0]] = counters
+            else:
+                entry["total"] = counters
+        return usage
+    
+    async def take_tokens(self, buckets, cost):
+        """Charge `cost` to every (key, capacity, refill_per_second) bucket in one atomic step.
+        
+        Returns 0 when the request is admitted, else the milliseconds until it would be.
+        """
+        if not self.client:
+            raise Exception("Redis client not initialized")
+        
+        if self._token_bucket is None:
+            self._token_bucket = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        args = [cost]
+        for _, capacity, refill_per_second in buckets:
+            args.extend((capacity, refill_per_second))
+        allowed, wait_ms = await self._token_bucket(
+            keys=[key for key, _, _ in buckets], args=args, client=self.client
+        )
+        return 0 if int(allowed) else int(wait_ms)
+    
     async def clear_cache(self):
         """Clear the response cache"""
         if not self.client:
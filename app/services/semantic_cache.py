@@ -0,0 +1,150 @@
+import logging
+from collections import OrderedDict
+import numpy as np
+from app.config import SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES
+from app.services.citation_index import provision_signature
+
+logger = logging.getLogger("NyayaGPT-API")
+
+# Upper bounds of the best-similarity histogram buckets used to tune the threshold
+SIMILARITY_BUCKETS = [0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.96, 0.98, 0.99, 1.0]
+
+class _Partition:
+    """Unit vectors of one partition in a preallocated matrix, updated in place.
+
+    Rows are filled in order; removing a row moves the last row into its slot, so lookups always
+    scan one contiguous block and nothing is restacked per insert.
+    """
+
+    def __init__(self, dimension, capacity=64):
+        self.matrix = np.empty((capacity, dimension), dtype=np.float32)
+        self.keys = []  # row -> cache key
+        self.rows = OrderedDict()  # cache key -> row, oldest first
+
+    def __len__(self):
+        return len(self.keys)
+
+    def put(self, cache_key, vector):
+        row = self.rows.get(cache_key)
+        if row is None:
+            row = len(self.keys)
+            if row == self.matrix.shape[0]:
+                grown = np.empty((row * 2, self.matrix.shape[1]), dtype=np.float32)
+                grown[:row] = self.matrix
+                self.matrix = grown
+            self.keys.append(cache_key)
+        self.matrix[row] = vector
+        self.rows[cache_key] = row
+        self.rows.move_to_end(cache_key)
+
+    def remove(self, cache_key):
+        row = self.rows.pop(cache_key, None)
+        if row is None:
+            return False
+        last = len(self.keys) - 1
+        if row != last:
+            moved = self.keys[last]
+            self.matrix[row] = self.matrix[last]
+            self.keys[row] = moved
+            self.rows[moved] = row
+        self.keys.pop()
+        return True
+
+    def oldest(self):
+        return next(iter(self.rows))
+
+    def similarities(self, vector):
+        return self.matrix[:len(self.keys)] @ vector
+
+class SemanticCache:
+    """Local vector index of cached queries, mapping paraphrases onto exact response cache keys"""
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        # partition -> _Partition; partitions never mix model/strategy/params or cited provisions
+        self._partitions = {}
+        self._size = 0
+        self.lookups = 0
+        self.hits = 0
+        self.similarity_counts = [0] * len(SIMILARITY_BUCKETS)
+
+    @staticmethod
+    def partition_key(model_name, strategy, temperature, max_tokens, query=""):
+        """Only answers generated with the same model and generation parameters are interchangeable,
+        and only for queries citing the same provisions and numbers: "section 420 IPC" and "section
+        302 IPC" embed almost identically but must never share an answer"""
+        signature = ",".join(provision_signature(query))
+        return f"{model_name}:{strategy}:{round(float(temperature), 3)}:{int(max_tokens)}:{signature}"
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _record_similarity(self, similarity):
+        for i, bound in enumerate(SIMILARITY_BUCKETS):
+            if similarity <= bound:
+                self.similarity_counts[i] += 1
+                return
+        self.similarity_counts[-1] += 1
+
+    def lookup(self, partition, vector):
+        """Return the cache key of the nearest cached query above the threshold, if any"""
+        self.lookups += 1
+        entries = self._partitions.get(partition)
+        if not entries:
+            return None
+
+        similarities = entries.similarities(self._unit(vector))
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        self._record_similarity(similarity)
+
+        if similarity >= self.threshold:
+            self.hits += 1
+            logger.info(f"Semantic cache hit (similarity {similarity:.3f})")
+            return entries.keys[best]
+        return None
+
+    def add(self, partition, vector, cache_key):
+        """Index the query vector of a freshly cached response"""
+        vector = self._unit(vector)
+        entries = self._partitions.get(partition)
+        if entries is None:
+            entries = self._partitions[partition] = _Partition(vector.shape[0])
+        before = len(entries)
+        entries.put(cache_key, vector)
+        self._size += len(entries) - before
+
+        while self._size > self.max_entries:
+            self._evict_oldest()
+
+    def discard(self, partition, cache_key):
+        """Drop an entry whose cached response has expired from Redis"""
+        entries = self._partitions.get(partition)
+        if entries and entries.remove(cache_key):
+            self._size -= 1
+            if not entries:
+                del self._partitions[partition]
+
+    def _evict_oldest(self):
+        partition = max(self._partitions, key=lambda name: len(self._partitions[name]))
+        self.discard(partition, self._partitions[partition].oldest())
+
+    def stats(self):
+        """Hit rate and best-similarity distribution for threshold tuning"""
+        return {
+            "threshold": self.threshold,
+            "entries": self._size,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "similarity_histogram": {
+                f"<={bound}": count for bound, count in zip(SIMILARITY_BUCKETS, self.similarity_counts)
+            }
+        }
+
+# Global semantic cache instance
+semantic_cache = SemanticCache()
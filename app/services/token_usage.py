@@ -0,0 +1,73 @@
+import time
+import logging
+from app.utils.helpers import count_tokens
+from app.services.redis_service import redis_service
+
+logger = logging.getLogger("NyayaGPT-API")
+
+class TokenUsage:
+    """Prompt/completion token accounting for one LLM call.
+
+    Provider-reported usage (`usage_metadata` on the final message or stream chunk) wins; when the
+    provider reports none, both sides are counted with the model's cached tiktoken encoder.
+    """
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.reported = False
+        self.duration = 0.0
+        self.started = time.perf_counter()
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    def observe(self, message):
+        """Pick up usage from an AIMessage or AIMessageChunk, if the provider attached it"""
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            self.prompt_tokens = usage.get("input_tokens", 0)
+            self.completion_tokens = usage.get("output_tokens", 0)
+            self.reported = True
+
+    async def finish(self, prompt, completion):
+        """Close the call: fill in counted usage if none was reported, then update the counters"""
+        self.duration = time.perf_counter() - self.started
+        if not self.reported:
+            self.prompt_tokens = count_tokens(prompt if isinstance(prompt, str) else str(prompt), self.model_name)
+            self.completion_tokens = count_tokens(completion, self.model_name)
+        await redis_service.record_usage(self.model_name, {
+            "requests": 1,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "generation_ms": round(self.duration * 1000),
+            "counted": 0 if self.reported else 1
+        })
+        return self
+
+    def metadata(self):
+        """Token fields for ResponseMetadata and the streaming `done` frame"""
+        return {
+            "tokens_used": self.total_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens
+        }
+
+def summarize_usage(usage):
+    """Add tokens/sec rates to the raw counters returned by RedisService.get_usage"""
+    def with_rates(counters):
+        seconds = counters.get("generation_ms", 0) / 1000
+        return dict(
+            counters,
+            completion_tokens_per_second=round(counters.get("completion_tokens", 0) / seconds, 2) if seconds else 0.0
+        )
+
+    return {
+        model_name: {
+            "total": with_rates(entry["total"]),
+            "workers": {worker: with_rates(counters) for worker, counters in entry["workers"].items()}
+        }
+        for model_name, entry in usage.items()
+    }
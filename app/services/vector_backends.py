@@ -0,0 +1,205 @@
+import os
+import json
+import mmap
+import time
+import logging
+from typing import List, Tuple
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger("NyayaGPT-API")
+
+# === Local Snapshot Format ===
+# A snapshot directory holds:
+#   manifest.json   - {"index_name", "embedding_model", "dimension", "count", "created"}
+#   vectors.npy     - float32 matrix (count x dimension) of unit-normalized vectors, memory-mapped
+#   metadata.jsonl  - one {"id", "text", "metadata"} object per row, in vector order
+#   offsets.npy     - int64 byte offsets (count + 1) of each row in metadata.jsonl
+SNAPSHOT_MANIFEST = "manifest.json"
+SNAPSHOT_VECTORS = "vectors.npy"
+SNAPSHOT_METADATA = "metadata.jsonl"
+SNAPSHOT_OFFSETS = "offsets.npy"
+
+class VectorBackend:
+    """Interface for the vector indexes VectorService can search"""
+
+    name = "base"
+
+    def search(self, embedding: np.ndarray, k: int) -> List[Tuple[Document, float]]:
+        """Return the k nearest documents to a query vector with their similarity scores"""
+        raise NotImplementedError
+
+    def search_with_vectors(self, embedding: np.ndarray, k: int) -> Tuple[List[Tuple[Document, float]], np.ndarray]:
+        """Like search, plus the matched vectors (k x dimension) for local reranking.
+
+        Backends that cannot return vectors give None, and reranking falls back to scores only.
+        """
+        return self.search(embedding, k), None
+
+    def describe(self) -> dict:
+        """Lightweight index statistics"""
+        return {"backend": self.name}
+
+class PineconeBackend(VectorBackend):
+    """Remote Pinecone index (the documents' text is stored under the `text` metadata key)"""
+
+    name = "pinecone"
+
+    def __init__(self, api_key, index_name, text_key="text"):
+        from pinecone import Pinecone
+
+        if not api_key:
+            logger.error("Pinecone API key not found")
+            raise ValueError("Pinecone API key is required")
+
+        pc = Pinecone(api_key=api_key)
+
+        if not pc.has_index(index_name):
+            logger.error(f"Pinecone index '{index_name}' does not exist")
+            raise ValueError(f"Pinecone index '{index_name}' does not exist")
+
+        self.index_name = index_name
+        self.index = pc.Index(index_name)
+        self.text_key = text_key
+
+    def _query(self, embedding, k, include_values):
+        results = self.index.query(
+            vector=np.asarray(embedding, dtype=np.float32).tolist(),
+            top_k=k,
+            include_metadata=True,
+            include_values=include_values
+        )
+
+        docs = []
+        values = []
+        for match in results["matches"]:
+            metadata = dict(match.get("metadata") or {})
+            if self.text_key not in metadata:
+                logger.warning(f"Found document with no `{self.text_key}` key. Skipping.")
+                continue
+            text = metadata.pop(self.text_key)
+            docs.append((Document(id=match["id"], page_content=text, metadata=metadata), match["score"]))
+            if include_values:
+                values.append(match["values"])
+        return docs, values
+
+    def search(self, embedding, k):
+        return self._query(embedding, k, include_values=False)[0]
+
+    def search_with_vectors(self, embedding, k):
+        # Same single round trip; the vectors only add to the response payload
+        docs, values = self._query(embedding, k, include_values=True)
+        vectors = np.asarray(values, dtype=np.float32) if values else None
+        return docs, vectors
+
+    def describe(self):
+        stats = self.index.describe_index_stats()
+        return {
+            "backend": self.name,
+            "index": self.index_name,
+            "vectors": stats.get("total_vector_count"),
+            "dimension": stats.get("dimension")
+        }
+
+class LocalBackend(VectorBackend):
+    """Memory-mapped snapshot searched with vectorized dot products.
+
+    The vector matrix and metadata file are mapped read-only, so every uvicorn worker on a host
+    shares the same page-cache copy instead of loading its own.
+    """
+
+    name = "local"
+
+    def __init__(self, path, expected_model=None):
+        with open(os.path.join(path, SNAPSHOT_MANIFEST)) as f:
+            self.manifest = json.load(f)
+
+        if expected_model and self.manifest.get("embedding_model") != expected_model:
+            logger.warning(
+                f"Snapshot embedded with {self.manifest.get('embedding_model')}, queries use {expected_model}"
+            )
+
+        self.path = path
+        self.vectors = np.load(os.path.join(path, SNAPSHOT_VECTORS), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, SNAPSHOT_OFFSETS), mmap_mode="r")
+        with open(os.path.join(path, SNAPSHOT_METADATA), "rb") as f:
+            self._metadata = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        logger.info(f"Loaded local snapshot {path} ({self.vectors.shape[0]} vectors)")
+
+    def record(self, row):
+        """Decode one metadata row without touching the rest of the file"""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self._metadata[start:end])
+
+    def document(self, row):
+        record = self.record(row)
+        return Document(id=record.get("id"), page_content=record.get("text", ""), metadata=record.get("metadata", {}))
+
+    def _top_rows(self, embedding, k):
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        scores = self.vectors @ query
+        k = min(k, scores.shape[0])
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), scores
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])], scores
+
+    def search(self, embedding, k):
+        top, scores = self._top_rows(embedding, k)
+        return [(self.document(int(row)), float(scores[row])) for row in top]
+
+    def search_with_vectors(self, embedding, k):
+        top, scores = self._top_rows(embedding, k)
+        docs = [(self.document(int(row)), float(scores[row])) for row in top]
+        return docs, (np.asarray(self.vectors[top], dtype=np.float32) if len(top) else None)
+
+    def describe(self):
+        return {
+            "backend": self.name,
+            "index": self.manifest.get("index_name"),
+            "vectors": int(self.vectors.shape[0]),
+            "dimension": int(self.vectors.shape[1]) if self.vectors.ndim == 2 else 0
+        }
+
+def write_snapshot(path, index_name, embedding_model, dimension, records):
+    """Write a local snapshot from an iterable of (id, values, text, metadata) records.
+
+    Rows are streamed through a raw float32 scratch file, so memory stays flat for large indexes.
+    """
+    os.makedirs(path, exist_ok=True)
+    scratch_path = os.path.join(path, SNAPSHOT_VECTORS + ".tmp")
+    offsets = [0]
+    count = 0
+    with open(os.path.join(path, SNAPSHOT_METADATA), "wb") as meta, open(scratch_path, "wb") as scratch:
+        for record_id, values, text, metadata in records:
+            vector = np.asarray(values, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            scratch.write((vector / norm if norm else vector).tobytes())
+            line = json.dumps({"id": record_id, "text": text, "metadata": metadata}).encode("utf-8") + b"\n"
+            meta.write(line)
+            offsets.append(offsets[-1] + len(line))
+            count += 1
+
+    matrix = np.lib.format.open_memmap(
+        os.path.join(path, SNAPSHOT_VECTORS), mode="w+", dtype=np.float32, shape=(count, dimension)
+    )
+    if count:
+        matrix[:] = np.memmap(scratch_path, dtype=np.float32, mode="r", shape=(count, dimension))
+    matrix.flush()
+    del matrix
+    os.remove(scratch_path)
+
+    np.save(os.path.join(path, SNAPSHOT_OFFSETS), np.asarray(offsets, dtype=np.int64))
+    with open(os.path.join(path, SNAPSHOT_MANIFEST), "w") as f:
+        json.dump({
+            "index_name": index_name,
+            "embedding_model": embedding_model,
+            "dimension": dimension,
+            "count": count,
+            "created": time.time()
+        }, f, indent=2)
+    return count
@@ -1,47 +1,185 @@
+import os
+import asyncio
+import hashlib
 import logging
-from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from pinecone import Pinecone
-from app.config import PINECONE_API_KEY, PINECONE_INDEX_NAME
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import numpy as np
+from app.config import (
+    PINECONE_API_KEY, PINECONE_INDEX_NAME, VECTOR_SEARCH_WORKERS,
+    EMBEDDING_MODEL, EMBEDDING_CACHE_SIZE, VECTOR_BACKEND, LOCAL_INDEX_PATH, CITATION_INDEX_PATH,
+    RETRIEVAL_K, RETRIEVAL_FETCH_K, MMR_LAMBDA, MAX_CHUNKS_PER_JUDGMENT
+)
+from app.services.vector_backends import PineconeBackend, LocalBackend, SNAPSHOT_MANIFEST
+from app.services.citation_index import citation_index
+from app.utils.helpers import normalize_query, mmr_select, judgment_key
+from app.utils.metrics import stage_timer, CACHE_LOOKUPS
+from app.services.redis_service import redis_service
 
 logger = logging.getLogger("NyayaGPT-API")
 
 class VectorService:
     def __init__(self):
-        self.vector_store = None
+        self.backend = None
+        self.embeddings = None
+        # Bounded pool for the blocking embedding + Pinecone calls so they never run on the event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=VECTOR_SEARCH_WORKERS,
+            thread_name_prefix="vector-search"
+        )
+        # Tier 1 of the query embedding cache (tier 2 lives in Redis as packed float32 bytes)
+        self._embedding_cache = OrderedDict()
     
-    def init_vector_store(self):
-        """Initialize Pinecone vector store with error handling"""
+    def init_vector_store(self, backend=None, embeddings=None):
+        """Initialize the configured vector backend (VECTOR_BACKEND) with error handling.
+        
+        A backend and embeddings can be passed in directly, e.g. local fakes for offline runs.
+        """
         try:
-            # Initialize Pinecone
-            if not PINECONE_API_KEY:
-                logger.error("Pinecone API key not found")
-                raise ValueError("Pinecone API key is required")
+            if embeddings is None:
+                from langchain_openai import OpenAIEmbeddings  # Heavy import, deferred to startup
+                embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+            self.embeddings = embeddings
             
-            pc = Pinecone(api_key=PINECONE_API_KEY)
+            if backend is not None:
+                self.backend = backend
+            elif VECTOR_BACKEND == "local":
+                self.backend = LocalBackend(LOCAL_INDEX_PATH, expected_model=EMBEDDING_MODEL)
+            else:
+                self.backend = PineconeBackend(PINECONE_API_KEY, PINECONE_INDEX_NAME)
             
-            if not pc.has_index(PINECONE_INDEX_NAME):
-                logger.error(f"Pinecone index '{PINECONE_INDEX_NAME}' does not exist")
-                raise ValueError(f"Pinecone index '{PINECONE_INDEX_NAME}' does not exist")
-            
-            index = pc.Index(PINECONE_INDEX_NAME)
-            
-            self.vector_store = PineconeVectorStore(
-                index=index, 
-                embedding=OpenAIEmbeddings(model="text-embedding-ada-002")
-            )
-            
-            logger.info("Vector store initialized")
-            return self.vector_store
+            logger.info(f"Vector store initialized ({self.backend.name} backend)")
+            return self.backend
         except Exception as e:
             logger.error(f"Vector store initialization error: {str(e)}")
             raise
     
+    def init_citation_index(self):
+        """Build the lexical citation index from the local snapshot, when one is available"""
+        try:
+            if isinstance(self.backend, LocalBackend):
+                source = self.backend
+            elif os.path.exists(os.path.join(CITATION_INDEX_PATH, SNAPSHOT_MANIFEST)):
+                source = LocalBackend(CITATION_INDEX_PATH)
+            else:
+                logger.info("No corpus snapshot found - citation index disabled, hybrid falls back to dense")
+                return
+            citation_index.build(source)
+        except Exception as e:
+            logger.error(f"Citation index initialization error: {str(e)}")
+    
     def get_vector_store(self):
-        """Get the vector store instance"""
-        if not self.vector_store:
+        """Get the vector backend instance"""
+        if not self.backend:
             raise ValueError("Vector store not initialized")
-        return self.vector_store
+        return self.backend
+    
+    async def run_blocking(self, fn, *args, **kwargs):
+        """Run a blocking vector store call on the bounded retrieval executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+    
+    def _embedding_key(self, normalized_query):
+        digest = hashlib.sha1(normalized_query.encode("utf-8")).hexdigest()
+        return f"emb:{EMBEDDING_MODEL}:{digest}"
+    
+    def _remember_embedding(self, key, vector):
+        self._embedding_cache[key] = vector
+        self._embedding_cache.move_to_end(key)
+        while len(self._embedding_cache) > EMBEDDING_CACHE_SIZE:
+            self._embedding_cache.popitem(last=False)
+    
+    async def aembed_query(self, query):
+        """Embed a single query through the embedding cache"""
+        return (await self.aembed_queries([query]))[0]
+    
+    async def aembed_queries(self, queries):
+        """Embed queries through the LRU -> Redis -> batched embeddings request tiers"""
+        self.get_vector_store()
+        
+        normalized = [normalize_query(query) for query in queries]
+        keys = [self._embedding_key(text) for text in normalized]
+        vectors = {}
+        
+        for key in keys:
+            if key in self._embedding_cache:
+                self._embedding_cache.move_to_end(key)
+                vectors[key] = self._embedding_cache[key]
+        
+        missing = list(dict.fromkeys(key for key in keys if key not in vectors))
+        if missing:
+            for key, packed in zip(missing, await redis_service.get_embeddings(missing)):
+                if packed:
+                    vectors[key] = np.frombuffer(packed, dtype=np.float32)
+                    self._remember_embedding(key, vectors[key])
+        
+        texts = {key: text for key, text in zip(keys, normalized) if key not in vectors}
+        CACHE_LOOKUPS.inc(len(keys) - len(texts), tier="embedding", result="hit")
+        if texts:
+            CACHE_LOOKUPS.inc(len(texts), tier="embedding", result="miss")
+            with stage_timer("embedding"):
+                embedded = await self.embeddings.aembed_documents(list(texts.values()))
+            packed_vectors = {}
+            for key, values in zip(texts, embedded):
+                vectors[key] = np.asarray(values, dtype=np.float32)
+                self._remember_embedding(key, vectors[key])
+                packed_vectors[key] = vectors[key].tobytes()
+            await redis_service.cache_embeddings(packed_vectors, defer=True)
+        
+        return [vectors[key] for key in keys]
+    
+    async def asearch_candidates(self, embedding, k=RETRIEVAL_FETCH_K):
+        """Over-fetch for local reranking: ((document, score) pairs, their vectors or None)"""
+        backend = self.get_vector_store()
+        with stage_timer("vector_search"):
+            return await self.run_blocking(backend.search_with_vectors, embedding, k)
+    
+    async def asearch_candidates_many(self, embeddings, k=RETRIEVAL_FETCH_K):
+        """Run one candidate search per query vector concurrently"""
+        return await asyncio.gather(*(self.asearch_candidates(embedding, k=k) for embedding in embeddings))
+    
+    def diversify(self, query_vector, scored_docs, vectors, k=RETRIEVAL_K, relevance=None):
+        """Pick k candidates by maximal marginal relevance, at most MAX_CHUNKS_PER_JUDGMENT per judgment.
+        
+        Relevance defaults to cosine similarity with the query, or the search scores when the
+        backend returned no vectors.
+        """
+        if relevance is None and vectors is None:
+            relevance = [score for _, score in scored_docs]
+        with stage_timer("rerank"):
+            picks = mmr_select(
+                query_vector,
+                vectors,
+                k,
+                relevance=relevance,
+                groups=[judgment_key(doc) for doc, _ in scored_docs],
+                lambda_mult=MMR_LAMBDA,
+                max_per_group=MAX_CHUNKS_PER_JUDGMENT or None
+            )
+        return [scored_docs[i][0] for i in picks]
+    
+    async def amax_marginal_relevance_search(self, query, k=RETRIEVAL_K, fetch_k=RETRIEVAL_FETCH_K):
+        """Over-fetch candidates with their vectors in one search, then rerank them locally"""
+        embedding = await self.aembed_query(query)
+        scored_docs, vectors = await self.asearch_candidates(embedding, k=fetch_k)
+        return self.diversify(embedding, scored_docs, vectors, k=k)
+    
+    async def describe(self):
+        """Index statistics (a cheap stats call for Pinecone), off the event loop"""
+        return await self.run_blocking(self.get_vector_store().describe)
+    
+    async def warm_up(self, query):
+        """One uncached embedding + search, opening the embeddings and index connections and
+        starting the retrieval executor before the first real request"""
+        backend = self.get_vector_store()
+        embedding = (await self.embeddings.aembed_documents([normalize_query(query)]))[0]
+        results = await self.run_blocking(backend.search, np.asarray(embedding, dtype=np.float32), 1)
+        return len(results)
+    
+    def close(self):
+        """Shut down the retrieval executor"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
 
 # Global vector service instance
 vector_service = VectorService()
\ No newline at end of file
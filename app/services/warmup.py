@@ -0,0 +1,95 @@
+import time
+import asyncio
+import logging
+from app.config import AVAILABLE_MODELS, WARMUP_ENABLED, WARMUP_QUERY, WARMUP_TIMEOUT
+from app.utils.helpers import get_encoder
+from app.services.redis_service import redis_service
+from app.services.vector_service import vector_service
+from app.services.llm_service import llm_service
+
+logger = logging.getLogger("NyayaGPT-API")
+
+class WarmUp:
+    """Startup warm-up run from the lifespan; the worker only reports ready once it has finished.
+
+    Stages run concurrently and a failing stage is logged and recorded rather than blocking
+    readiness, so a slow dependency degrades the first requests instead of keeping the worker out.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.stages = {}
+        self.started = time.time()
+        self.duration = None
+        self._task = None
+
+    def start(self):
+        """Run the warm-up in the background so liveness checks answer while it is in progress"""
+        if not WARMUP_ENABLED:
+            self.ready = True
+            self.duration = 0.0
+            logger.info("Warm-up disabled - reporting ready immediately")
+            return
+        if not self._task:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def run(self):
+        start = time.perf_counter()
+        await asyncio.gather(
+            self._stage("tokenizers", self._load_encoders),
+            self._stage("redis", self._open_redis),
+            self._stage("llm", llm_service.warm_up),
+            self._stage("retrieval", lambda: vector_service.warm_up(WARMUP_QUERY))
+        )
+        self.duration = time.perf_counter() - start
+        self.ready = True
+        failed = [name for name, stage in self.stages.items() if stage["status"] != "ok"]
+        logger.info(
+            f"Warm-up finished in {self.duration:.2f}s"
+            + (f" ({', '.join(failed)} failed)" if failed else "")
+        )
+
+    async def _stage(self, name, fn):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(fn(), timeout=WARMUP_TIMEOUT)
+            status = "ok"
+        except asyncio.TimeoutError:
+            logger.warning(f"Warm-up stage {name} timed out after {WARMUP_TIMEOUT}s")
+            status = "timeout"
+        except Exception as e:
+            logger.warning(f"Warm-up stage {name} failed: {str(e)}")
+            status = "error"
+        self.stages[name] = {"status": status, "seconds": round(time.perf_counter() - start, 3)}
+
+    async def _load_encoders(self):
+        # Reading the BPE ranks is blocking file (or network) I/O - keep it off the event loop
+        await asyncio.to_thread(lambda: [get_encoder(model) for model in AVAILABLE_MODELS])
+
+    async def _open_redis(self):
+        if not redis_service.client:
+            raise ValueError("Redis not connected")
+        await asyncio.gather(*(
+            client.ping() for client in (redis_service.client, redis_service.binary_client) if client
+        ))
+
+    def status(self):
+        """Readiness payload for /ready"""
+        return {
+            "status": "ready" if self.ready else "warming_up",
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "warmup_seconds": round(self.duration, 3) if self.duration is not None else None,
+            "stages": self.stages
+        }
+
+# Global warm-up instance
+warmup = WarmUp()
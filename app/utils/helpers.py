@@ -1,78 +1,247 @@
 import re
 import time
-import random
-import tiktoken
 import logging
 from typing import List, Dict
+import numpy as np
 
 logger = logging.getLogger("NyayaGPT-API")
 
-def is_simple_greeting(text):
-    """Detect if input is a simple greeting that doesn't need RAG"""
-    text = text.lower().strip()
-    greeting_patterns = [
-        r'^(hi|hello|hey|greetings|namaste|howdy)[\s\W]*$',
-        r'^(good\s*(morning|afternoon|evening|day))[\s\W]*$',
-        r'^(how\s*(are\s*you|is\s*it\s*going|are\s*things))[\s\W]*$',
-        r'^(what\'*s\s*up)[\s\W]*$'
-    ]
-    
-    for pattern in greeting_patterns:
-        if re.match(pattern, text):
-            return True
-    return False
-
-def get_greeting_response(greeting_text):
-    """Generate appropriate response for simple greetings without using LLM"""
-    greeting_text = greeting_text.lower().strip()
-    
-    if re.match(r'^(hi|hello|hey|howdy)[\s\W]*$', greeting_text):
-        responses = [
-            "Hello! How can I help you with legal information today?",
-            "Hi there! I'm NyayaGPT, your legal assistant. What legal questions can I help you with?",
-            "Hello! I'm ready to assist with your legal queries."
-        ]
-        return random.choice(responses)
-    
-    elif re.match(r'^(good\s*morning)[\s\W]*$', greeting_text):
-        return "Good morning! How can I assist you with legal matters today?"
+def normalize_query(text):
+    """Normalize query text for cache keys: lowercase, collapse whitespace, drop trailing punctuation"""
+    return " ".join(text.lower().split()).rstrip("?.! ")
+
+# Sentence ends, ignoring the abbreviations legal text is full of ("Sec. 420", "A v. B", "Ors.")
+_SENTENCE_END_RE = re.compile(r"[.!?][\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+_ABBREVIATIONS = frozenset(
+    "v vs sec secs s ss art arts no nos cl r o ors anr etc viz i.e e.g mr mrs ms dr hon'ble honble "
+    "j jj cj p pp para paras vol ltd co pvt govt dept st u/s".split()
+)
+
+def split_sentences(text):
+    """Split text into sentences without breaking on legal abbreviations"""
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        words = text[start:match.start() + 1].split()
+        last_word = words[-1].rstrip(".").lower() if words else ""
+        if last_word in _ABBREVIATIONS or (len(last_word) == 1 and last_word.isalpha()):
+            continue
+        sentences.append(text[start:match.end()].strip())
+        start = match.end()
+    tail = text[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+def _sentence_fingerprint(sentence):
+    return " ".join(re.findall(r"\w+", sentence.lower()))
+
+def _water_level(needs, budget):
+    """Largest per-item cap such that min(need, cap) summed over items fits the budget"""
+    remaining = budget
+    ordered = sorted(needs)
+    for position, need in enumerate(ordered):
+        share = remaining / (len(ordered) - position)
+        if need > share:
+            return share
+        remaining -= need
+    return float("inf")
+
+def pack_context(docs, budget_tokens, model="gpt-4o-mini", max_overlap=0.8):
+    """Pack ranked documents into a prompt context of at most `budget_tokens` tokens.
+
+    The budget is shared water-filling style (short chunks are kept whole, long ones split what is
+    left), every chunk is cut on a sentence boundary, and sentences already included from a higher
+    ranked overlapping chunk are skipped; chunks that are mostly duplicates are dropped entirely.
+    """
+    candidates = []
+    for doc in docs:
+        title = doc.metadata.get("title", "Untitled Document")
+        url = doc.metadata.get("url", "No URL")
+        header = f"### {title}\n**Source:** {url}\n\n"
+        sentences = []
+        fingerprints = set()
+        for sentence in split_sentences(" ".join(doc.page_content.split())):
+            fingerprint = _sentence_fingerprint(sentence)
+            if fingerprint not in fingerprints:
+                fingerprints.add(fingerprint)
+                sentences.append((sentence, fingerprint, count_tokens(sentence, model) + 1))
+        if sentences:
+            header_tokens = count_tokens(header, model)
+            candidates.append((header, header_tokens, sentences, header_tokens + sum(t for _, _, t in sentences)))
+
+    sections = []
+    seen = set()
+    remaining = budget_tokens
+    for position, (header, header_tokens, sentences, need) in enumerate(candidates):
+        fresh = [entry for entry in sentences if entry[1] not in seen]
+        if not fresh or len(fresh) < (1 - max_overlap) * len(sentences):
+            continue  # Overlapping chunk already covered by a higher ranked document
+
+        level = _water_level([c[3] for c in candidates[position:]], remaining)
+        allowance = min(need, level) - header_tokens
+        if allowance <= 0:
+            continue
+
+        kept = []
+        used = 0
+        for entry in fresh:
+            if used + entry[2] > allowance:
+                break
+            kept.append(entry)
+            used += entry[2]
+        truncated = len(kept) < len(fresh)
+        if truncated and kept and used + 1 > allowance:
+            used -= kept.pop()[2]  # Make room for the truncation marker
+        if truncated:
+            used += 1
+
+        body = [sentence for sentence, _, _ in kept]
+        seen.update(fingerprint for _, fingerprint, _ in kept)
+        if not body:
+            if allowance < 32:
+                continue  # Too little room left for a useful fragment
+            # A single sentence longer than the allowance: keep its leading tokens
+            body.append(truncate_tokens(fresh[0][0], int(allowance) - 2, model))
+            seen.add(fresh[0][1])
+            used = int(allowance)
+
+        sections.append(header + " ".join(body) + (" ..." if truncated else ""))
+        remaining -= used + header_tokens + 1  # Section separator
+
+    return "\n\n".join(sections)
+
+def doc_key(doc):
+    """Stable identity for a retrieved chunk, used to merge results across searches"""
+    if getattr(doc, "id", None):
+        return doc.id
+    return f"{doc.metadata.get('url', '')}:{doc.page_content[:200]}"
+
+def reciprocal_rank_fusion(ranked_lists, k=60, limit=3, with_scores=False):
+    """Merge several ranked document lists with reciprocal-rank fusion"""
+    scores = {}
+    docs = {}
+    for ranked in ranked_lists:
+        for rank, doc in enumerate(ranked):
+            key = doc_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
     
-    elif re.match(r'^(good\s*afternoon)[\s\W]*$', greeting_text):
-        return "Good afternoon! What legal questions can I help you with today?"
+    ordered = sorted(scores, key=scores.get, reverse=True)[:limit]
+    if with_scores:
+        return [(docs[key], scores[key]) for key in ordered]
+    return [docs[key] for key in ordered]
+
+def judgment_key(doc):
+    """Which judgment a chunk was cut from, for the per-judgment diversity cap"""
+    return doc.metadata.get("url") or doc.metadata.get("title") or doc_key(doc)
+
+def mmr_select(query_vector, vectors, k, relevance=None, groups=None, lambda_mult=0.7, max_per_group=None):
+    """Greedy maximal-marginal-relevance selection of k candidate indices.
     
-    elif re.match(r'^(good\s*evening)[\s\W]*$', greeting_text):
-        return "Good evening! I'm here to help with any legal queries you might have."
+    Each step picks the candidate maximizing lambda * relevance - (1 - lambda) * (max cosine
+    similarity to anything already picked), with at most max_per_group picks per group. Relevance
+    defaults to cosine similarity with the query; without vectors only relevance and the group cap
+    apply. The cap is relaxed rather than returning fewer than k when candidates run out.
+    """
+    n = len(relevance) if vectors is None else vectors.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return []
     
-    elif re.match(r'^(how\s*are\s*you)[\s\W]*$', greeting_text):
-        return "I'm functioning well, thank you for asking! I'm ready to assist with your legal questions."
+    if vectors is not None:
+        unit = np.asarray(vectors, dtype=np.float32)
+        unit = unit / np.maximum(np.linalg.norm(unit, axis=1, keepdims=True), 1e-12)
+        if relevance is None:
+            query = np.asarray(query_vector, dtype=np.float32)
+            relevance = unit @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        similarity = unit @ unit.T
+    else:
+        similarity = None
+    relevance = np.asarray(relevance, dtype=np.float32)
     
-    elif re.match(r'^(what\'*s\s*up)[\s\W]*$', greeting_text):
-        return "I'm here and ready to help with your legal queries! What can I assist you with today?"
+    group_ids = np.unique(groups, return_inverse=True)[1] if groups is not None and max_per_group else None
+    group_counts = np.zeros(n if group_ids is None else group_ids.max() + 1, dtype=np.int32)
+    redundancy = np.zeros(n, dtype=np.float32)
+    selected = np.zeros(n, dtype=bool)
+    available = np.ones(n, dtype=bool)
+    picks = []
     
-    return "Hello! I'm NyayaGPT, your legal assistant. How can I help you today?"
+    while len(picks) < k:
+        if not available.any():
+            available = ~selected  # Every remaining candidate is capped: relax the cap
+            group_ids = None
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        picks.append(pick)
+        selected[pick] = True
+        available[pick] = False
+        if similarity is not None:
+            np.maximum(redundancy, similarity[pick], out=redundancy)
+        if group_ids is not None:
+            group = group_ids[pick]
+            group_counts[group] += 1
+            if group_counts[group] >= max_per_group:
+                available[group_ids == group] = False
+    return picks
 
-def format_docs(docs, max_length=400):
-    """Format documents with shorter length limit for faster processing"""
-    result = []
-    for doc in docs[:3]:  # Only use top 3 documents for speed
-        title = doc.metadata.get("title", "Untitled Document")
-        url = doc.metadata.get("url", "No URL")
-        result.append(f"### {title}\n**Source:** {url}\n\n{doc.page_content.strip()[:max_length]}...")
-    return "\n\n".join(result)
+_ENCODER_RETRY_MIN = 5.0  # Seconds before retrying a tokenizer that failed to load, doubled per failure
+_ENCODER_RETRY_MAX = 300.0
+_encoders = {}
+_encoder_failures = {}  # model -> (monotonic time of the next attempt, current backoff)
+
+def get_encoder(model="gpt-3.5-turbo"):
+    """Tiktoken encoder for a model, built once per process.
+
+    Returns None when it cannot be loaded; failures (often a transient BPE download error) are
+    retried with exponential backoff rather than remembered for the life of the process.
+    """
+    encoder = _encoders.get(model)
+    if encoder is not None:
+        return encoder
+    retry_at, backoff = _encoder_failures.get(model, (0.0, _ENCODER_RETRY_MIN / 2))
+    if time.monotonic() < retry_at:
+        return None
+    try:
+        import tiktoken  # Deferred: only needed once the first encoder is built
+        try:
+            encoding_name = tiktoken.encoding_name_for_model(model)
+        except KeyError:
+            encoding_name = "o200k_base" if model.startswith(("gpt-4o", "o1", "o3")) else "cl100k_base"
+        encoder = _encoders[model] = tiktoken.get_encoding(encoding_name)
+        _encoder_failures.pop(model, None)
+        return encoder
+    except Exception as e:
+        backoff = min(backoff * 2, _ENCODER_RETRY_MAX)
+        _encoder_failures[model] = (time.monotonic() + backoff, backoff)
+        logger.warning(
+            f"Tokenizer for {model} unavailable: {str(e)}. Using approximate counts, retrying in {backoff:.0f}s."
+        )
+        return None
 
 def count_tokens(text, model="gpt-3.5-turbo"):
     """Count tokens in text with error handling"""
+    encoder = get_encoder(model)
+    if encoder is None:
+        return len(text) // 4
     try:
-        enc = tiktoken.encoding_for_model(model)
-        return len(enc.encode(text))
+        return len(encoder.encode(text, disallowed_special=()))
     except Exception as e:
         logger.warning(f"Error counting tokens: {str(e)}. Using approximate count.")
         return len(text) // 4
 
-def format_conversation_history(messages, max_tokens=500):
+def truncate_tokens(text, max_tokens, model="gpt-3.5-turbo"):
+    """Cut text to its first `max_tokens` tokens"""
+    encoder = get_encoder(model)
+    if encoder is None:
+        return text[:max(0, max_tokens) * 4]
+    return encoder.decode(encoder.encode(text, disallowed_special=())[:max(0, max_tokens)])
+
+def format_conversation_history(messages, max_tokens=500, max_messages=4):
     """Format conversation history with reduced token limit for speed"""
     formatted_history = []
-    for msg in messages[-4:]:  # Only keep last 4 messages for speed
+    for msg in messages[-max_messages:]:  # Only keep the last few messages for speed
         role = msg.get("role", "user" if "query" in msg else "assistant")
         content = msg.get("content", msg.get("query", msg.get("response", "")))
         # Truncate long messages
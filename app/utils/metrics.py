@@ -0,0 +1,195 @@
+import json
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from app.utils.tracing import open_span, close_span
+
+# === Metric Types ===
+# A small in-process registry rendered in the Prometheus text exposition format. Each worker keeps
+# its own registry; snapshots are exchanged through Redis (see RedisService.metrics_publisher) and
+# summed, so any worker can answer /metrics for the whole deployment.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()  # Vector searches record from executor threads
+
+def _label_key(labelnames, labels):
+    return json.dumps([str(labels.get(name, "")) for name in labelnames])
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, json.loads(key)))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def snapshot(self):
+        with _lock:
+            return dict(self.values)
+
+    @staticmethod
+    def merge(into, values):
+        for key, value in values.items():
+            into[key] = into.get(key, 0) + value
+
+    def render(self, values):
+        for key in sorted(values):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(values[key])}"
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # label key -> [per-bucket counts (+Inf last), sum, count]
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self):
+        with _lock:
+            return {key: [list(counts), total, count] for key, (counts, total, count) in self.values.items()}
+
+    @staticmethod
+    def merge(into, values):
+        for key, (counts, total, count) in values.items():
+            entry = into.get(key)
+            if entry is None or len(entry[0]) != len(counts):
+                into[key] = [list(counts), total, count]
+                continue
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += total
+            entry[2] += count
+
+    def render(self, values):
+        for key in sorted(values):
+            counts, total, count = values[key]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_number(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_number(float(total))}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._metrics.setdefault(name, Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._metrics.setdefault(name, Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self):
+        """This worker's values, as a JSON-serializable dict"""
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def merge(self, snapshots):
+        """Sum several worker snapshots into one"""
+        merged = {name: {} for name in self._metrics}
+        for snapshot in snapshots:
+            for name, values in snapshot.items():
+                if name in self._metrics:
+                    self._metrics[name].merge(merged[name], values)
+        return merged
+
+    def render(self, snapshot):
+        """Prometheus text exposition of a (merged) snapshot"""
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render(snapshot.get(name, {})))
+        return "\n".join(lines) + "\n"
+
+# Global metrics registry instance
+metrics = MetricsRegistry()
+
+# === Pipeline Metrics ===
+REQUEST_SECONDS = metrics.histogram(
+    "nyayagpt_request_seconds", "End-to-end query latency", ["mode", "outcome"]
+)
+STAGE_SECONDS = metrics.histogram(
+    "nyayagpt_stage_seconds", "Latency of one pipeline stage", ["stage"]
+)
+TTFT_SECONDS = metrics.histogram(
+    "nyayagpt_time_to_first_token_seconds", "Time from the LLM call to its first streamed token", ["model"]
+)
+GENERATION_SECONDS = metrics.histogram(
+    "nyayagpt_generation_seconds", "Time from the LLM call to its last token", ["model"]
+)
+CACHE_LOOKUPS = metrics.counter(
+    "nyayagpt_cache_lookups_total", "Cache lookups by tier (exact, semantic, embedding)", ["tier", "result"]
+)
+FAST_PATH_ANSWERS = metrics.counter(
+    "nyayagpt_fast_path_total", "Queries answered without retrieval or the LLM", ["kind"]
+)
+ADMISSION_REJECTIONS = metrics.counter(
+    "nyayagpt_admission_rejections_total", "Queries shed by admission control", ["model", "reason"]
+)
+ADMISSION_WAIT_SECONDS = metrics.histogram(
+    "nyayagpt_admission_wait_seconds", "Time admitted queries waited for a model slot", ["model"]
+)
+LLM_HEDGES = metrics.counter(
+    "nyayagpt_llm_hedges_total", "LLM calls raced against a backup after a late first token", ["model", "winner"]
+)
+LLM_HEDGE_CANCELS = metrics.counter(
+    "nyayagpt_llm_hedge_cancels_total", "Hedged LLM calls cancelled after losing the race", ["model"]
+)
+RETRIEVAL_FALLBACKS = metrics.counter(
+    "nyayagpt_retrieval_fallbacks_total", "Retrievals that fell back to the simple strategy", ["strategy"]
+)
+STAGE_ERRORS = metrics.counter(
+    "nyayagpt_errors_total", "Errors by pipeline stage", ["stage"]
+)
+
+@contextmanager
+def stage_timer(stage):
+    """Time a pipeline stage into nyayagpt_stage_seconds (and the request trace, when one is active),
+    counting exceptions that escape it"""
+    start = time.perf_counter()
+    span = open_span(stage, start)
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        end = time.perf_counter()
+        STAGE_SECONDS.observe(end - start, stage=stage)
+        if span is not None:
+            close_span(span, end)
@@ -1,8 +1,8 @@
-from langchain.prompts import PromptTemplate, ChatPromptTemplate
+import hashlib
+from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
 
 # === Prompt Templates ===
-final_prompt = PromptTemplate(
-    template="""
+FINAL_PROMPT_TEMPLATE = """
 You are NyayaGPT, a legal assistant for Indian law. Be concise but comprehensive.
 
 Instructions:
@@ -20,15 +20,25 @@ Legal Context: {context}
 
 Query: {question}
 
-Response:""",
-    input_variables=["history", "context", "question"]
-)
+Response:"""
 
-fusion_prompt = ChatPromptTemplate.from_template("""
+FUSION_PROMPT_TEMPLATE = """
 You are an assistant skilled in legal language modeling.
 Given the following user query, generate 3 different rephrasings of it as formal Indian legal questions.
 Do not invent extra facts or foreign law. Just reword using Indian legal terminology.
 
 User Query: {question}
 
-Three Rephrasings:""")
\ No newline at end of file
+Three Rephrasings:"""
+
+final_prompt = PromptTemplate(
+    template=FINAL_PROMPT_TEMPLATE,
+    input_variables=["history", "context", "question"]
+)
+
+fusion_prompt = ChatPromptTemplate.from_template(FUSION_PROMPT_TEMPLATE)
+
+# Changes whenever a template is edited, so cached answers from an older prompt are never served
+PROMPT_VERSION = hashlib.sha256(
+    (FINAL_PROMPT_TEMPLATE + FUSION_PROMPT_TEMPLATE).encode("utf-8")
+).hexdigest()[:12]
\ No newline at end of file
@@ -0,0 +1,120 @@
+import re
+import random
+from dataclasses import dataclass
+from typing import Optional
+
+# === Fast-Path Intents ===
+# Every intent is a named group of one combined pattern, compiled once at import and matched
+# against the whole (lowercased, trimmed) query. The group that matched names the answer.
+_TRAILER = r"[\s\W]*"
+_INTENT_PATTERNS = {
+    # Greetings
+    "hello": r"(?:hi+|hello+|hey+|hiya|greetings|namaste|namaskar|howdy)(?:\s+(?:there|nyayagpt|bot))?",
+    "good_morning": r"good\s*morning",
+    "good_afternoon": r"good\s*afternoon",
+    "good_evening": r"good\s*evening",
+    "good_day": r"good\s*day",
+    "how_are_you": r"how\s*(?:are\s*you|is\s*it\s*going|are\s*things)(?:\s+doing)?(?:\s+today)?",
+    "whats_up": r"what'*s\s*up|wh?at\s+up|sup",
+    # Thanks / goodbye
+    "thanks": r"(?:ok(?:ay)?\s+)?(?:thanks?(?:\s+you)?|thank\s*you|thx|ty|many\s+thanks|dhanyavad|shukriya)"
+              r"(?:\s+(?:so\s+much|very\s+much|a\s+lot))?(?:\s+(?:nyayagpt|bot))?",
+    "goodbye": r"(?:ok(?:ay)?\s+)?(?:bye+|goodbye|good\s*bye|bye\s+bye|see\s+you(?:\s+later)?|good\s*night|"
+               r"that'?s\s+all|that\s+is\s+all)",
+    # Meta questions about NyayaGPT itself
+    "meta_identity": r"(?:who|what)\s+(?:are\s+you|is\s+(?:this|nyayagpt|nyaya\s*gpt))|what\s+is\s+your\s+name|"
+                     r"introduce\s+yourself|tell\s+me\s+about\s+yourself",
+    "meta_capabilities": r"what\s+(?:can|do)\s+you\s+(?:do|help(?:\s+me)?\s+with)|how\s+can\s+you\s+help(?:\s+me)?|"
+                         r"what\s+are\s+your\s+(?:capabilities|features)|help",
+    "meta_sources": r"(?:what|which)\s+(?:are\s+your\s+sources|sources\s+do\s+you\s+use|data\s+(?:are|were)\s+you\s+trained\s+on)|"
+                    r"where\s+do\s+you\s+get\s+(?:your\s+)?(?:information|data)",
+    "meta_advice": r"(?:are\s+you|is\s+this)\s+(?:a\s+)?(?:real\s+)?(?:lawyer|advocate|legal\s+advice)|"
+                   r"can\s+i\s+rely\s+on\s+(?:you|your\s+answers)",
+}
+_FAST_PATH_RE = re.compile(
+    "|".join(f"(?P<{name}>{pattern})" for name, pattern in _INTENT_PATTERNS.items()).join(["^(?:", f"){_TRAILER}$"])
+)
+
+_RESPONSES = {
+    "hello": [
+        "Hello! How can I help you with legal information today?",
+        "Hi there! I'm NyayaGPT, your legal assistant. What legal questions can I help you with?",
+        "Hello! I'm ready to assist with your legal queries."
+    ],
+    "good_morning": ["Good morning! How can I assist you with legal matters today?"],
+    "good_afternoon": ["Good afternoon! What legal questions can I help you with today?"],
+    "good_evening": ["Good evening! I'm here to help with any legal queries you might have."],
+    "good_day": ["Hello! I'm NyayaGPT, your legal assistant. How can I help you today?"],
+    "how_are_you": ["I'm functioning well, thank you for asking! I'm ready to assist with your legal questions."],
+    "whats_up": ["I'm here and ready to help with your legal queries! What can I assist you with today?"],
+    "thanks": [
+        "You're welcome! Feel free to ask if you have any other legal questions.",
+        "Glad I could help! Let me know if there's anything else you'd like to know about Indian law."
+    ],
+    "goodbye": ["Goodbye! Come back any time you have a legal question."],
+    "meta_identity": [
+        "I'm NyayaGPT, a legal assistant for Indian law. I answer questions using Indian statutes and "
+        "judgments, and cite the sources I rely on."
+    ],
+    "meta_capabilities": [
+        "I can explain provisions of Indian statutes (for example \"What is Section 498A IPC?\"), summarise "
+        "and find judgments, compare legal concepts, outline procedures, and help draft legal documents. "
+        "Ask me a legal question to get started."
+    ],
+    "meta_sources": [
+        "My answers are grounded in a corpus of Indian statutes and court judgments. Each answer lists the "
+        "documents it drew on under its sources so you can verify them."
+    ],
+    "meta_advice": [
+        "I'm an AI legal assistant, not a lawyer. My answers are general legal information about Indian law "
+        "and are not a substitute for advice from a qualified advocate on your specific facts."
+    ],
+}
+
+_INTENT_KINDS = {
+    "thanks": "farewell",
+    "goodbye": "farewell",
+    "meta_identity": "meta",
+    "meta_capabilities": "meta",
+    "meta_sources": "meta",
+    "meta_advice": "meta",
+}
+
+# Bare statute lookups ("Section 420 IPC", "what is article 21 of the constitution") skip query
+# rephrasing and go straight to the citation index
+_LOOKUP_RE = re.compile(
+    r"^(?:(?:what\s+(?:is|does)|explain|define|meaning\s+of|text\s+of)\s+)?(?:the\s+)?"
+    r"(?:section|sec|s|article|art)\.?\s*\d+[a-z]?"
+    r"(?:\s+(?:of\s+)?(?:the\s+)?(?:ipc|i\.p\.c|indian\s+penal\s+code|crpc|cr\.?p\.?c|code\s+of\s+criminal\s+procedure|"
+    r"cpc|code\s+of\s+civil\s+procedure|constitution(?:\s+of\s+india)?|bns|bnss|bharatiya\s+\w+\s+sanhita|"
+    r"(?:indian\s+)?evidence\s+act))?"
+    r"(?:\s+(?:say|says|mean|means|state|states))?"
+    + _TRAILER + "$"
+)
+
+@dataclass
+class FastPathRoute:
+    """Outcome of routing a query: a precomputed answer, or a cheaper retrieval strategy"""
+    kind: str  # "greeting", "farewell", "meta" or "lookup"
+    intent: str
+    response: Optional[str] = None
+    strategy: Optional[str] = None
+
+def route_query(text) -> Optional[FastPathRoute]:
+    """Classify a query for the fast path; None means it needs the full RAG pipeline"""
+    text = text.lower().strip()
+    if len(text) > 120:
+        return None
+
+    match = _FAST_PATH_RE.match(text)
+    if match:
+        intent = match.lastgroup
+        return FastPathRoute(
+            kind=_INTENT_KINDS.get(intent, "greeting"),
+            intent=intent,
+            response=random.choice(_RESPONSES[intent])
+        )
+
+    if _LOOKUP_RE.match(text):
+        return FastPathRoute(kind="lookup", intent="statute_lookup", strategy="hybrid")
+    return None
@@ -0,0 +1,112 @@
+import json
+import time
+import asyncio
+from typing import AsyncIterator
+
+try:
+    import orjson
+except ImportError:  # Optional faster encoder for delta frames
+    orjson = None
+
+from app.config import STREAM_COALESCE_MS, STREAM_COALESCE_BYTES
+
+# === Stream Protocol Versions ===
+LEGACY_PROTOCOL = 1  # {"chunk", "full"} per token, resends the accumulated answer
+DELTA_PROTOCOL = 2   # {"delta"} per coalesced frame
+SUPPORTED_PROTOCOLS = (LEGACY_PROTOCOL, DELTA_PROTOCOL)
+
+def encode_event(data, fast=False):
+    """Encode a payload as a single SSE data event"""
+    if fast and orjson is not None:
+        return f"data: {orjson.dumps(data).decode()}\n\n"
+    return f"data: {json.dumps(data)}\n\n"
+
+class SSEStream:
+    """Turns answer chunks into SSE frames for a negotiated stream protocol"""
+
+    def __init__(self, protocol=LEGACY_PROTOCOL, window_ms=STREAM_COALESCE_MS, max_bytes=STREAM_COALESCE_BYTES,
+                 trace=None):
+        self.protocol = protocol if protocol in SUPPORTED_PROTOCOLS else LEGACY_PROTOCOL
+        self.window = window_ms / 1000
+        self.max_bytes = max_bytes
+        self.trace = trace  # Request trace to attach to the done frame (debug requests only)
+        self.full = ""
+        self.bytes_sent = 0
+
+    def _emit(self, data):
+        event = encode_event(data, fast=self.protocol == DELTA_PROTOCOL)
+        self.bytes_sent += len(event)
+        return event
+
+    def _chunk_frame(self, chunk):
+        if self.protocol == DELTA_PROTOCOL:
+            return self._emit({"delta": chunk})
+        return self._emit({"chunk": chunk, "full": self.full})
+
+    def message(self, text):
+        """Frame a complete, non-streamed answer (fast paths)"""
+        self.full += text
+        return self._chunk_frame(text)
+
+    def done(self, completion_data):
+        if self.trace is not None:
+            self.trace.root.attrs["sse_bytes"] = self.bytes_sent
+            completion_data = dict(completion_data, trace=dict(
+                self.trace.to_dict(), server_timing=self.trace.server_timing()
+            ))
+        return self._emit(completion_data)
+
+    def error(self, error_data):
+        return self._emit(error_data)
+
+    async def frames(self, chunks: AsyncIterator[str]):
+        """Yield SSE frames for the chunk stream, coalescing deltas on a time/size window"""
+        if self.protocol == LEGACY_PROTOCOL:
+            async for chunk in chunks:
+                self.full += chunk
+                yield self._chunk_frame(chunk)
+            return
+
+        iterator = chunks.__aiter__()
+        pending = None
+        buffer = []
+        buffered_bytes = 0
+        deadline = None
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+
+                timeout = max(0.0, deadline - time.monotonic()) if buffer else None
+                finished, _ = await asyncio.wait({pending}, timeout=timeout)
+
+                if finished:
+                    try:
+                        chunk = pending.result()
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        pending = None
+                    if not chunk:
+                        continue
+                    if not buffer:
+                        deadline = time.monotonic() + self.window
+                    buffer.append(chunk)
+                    buffered_bytes += len(chunk.encode("utf-8"))
+                    if buffered_bytes < self.max_bytes and time.monotonic() < deadline:
+                        continue
+
+                # Window elapsed or size reached: flush the coalesced delta
+                text = "".join(buffer)
+                buffer.clear()
+                buffered_bytes = 0
+                self.full += text
+                yield self._chunk_frame(text)
+
+            if buffer:
+                text = "".join(buffer)
+                self.full += text
+                yield self._chunk_frame(text)
+        finally:
+            if pending is not None:
+                pending.cancel()
@@ -0,0 +1,154 @@
+import os
+import time
+import uuid
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # Optional sampling profiler for traced requests
+    Profiler = None
+
+from app.config import TRACE_PROFILE_DIR, TRACE_PROFILES_PER_MINUTE
+
+logger = logging.getLogger("NyayaGPT-API")
+
+# === Per-Request Tracing ===
+# Off unless a request opts in: with no active trace, opening a span is a single ContextVar read.
+_current_trace = ContextVar("nyayagpt_trace", default=None)
+_current_span = ContextVar("nyayagpt_span", default=None)
+
+class Span:
+    __slots__ = ("name", "start", "end", "attrs", "children", "_token")
+
+    def __init__(self, name, start):
+        self.name = name
+        self.start = start
+        self.end = None
+        self.attrs = {}
+        self.children = []
+        self._token = None
+
+    def to_dict(self, origin):
+        end = self.end if self.end is not None else time.perf_counter()
+        data = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 2),
+            "duration_ms": round((end - self.start) * 1000, 2)
+        }
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.children:
+            data["children"] = [child.to_dict(origin) for child in self.children]
+        return data
+
+class Trace:
+    """Span tree of one request's pipeline stages"""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:16]
+        self.root = Span("request", time.perf_counter())
+
+    def to_dict(self):
+        return dict(self.root.to_dict(self.root.start), trace_id=self.id)
+
+    def server_timing(self):
+        """Server-Timing header value: total time plus summed time per stage name"""
+        totals = {}
+        counts = {}
+
+        def walk(span):
+            for child in span.children:
+                if child.end is not None:
+                    totals[child.name] = totals.get(child.name, 0.0) + (child.end - child.start)
+                    counts[child.name] = counts.get(child.name, 0) + 1
+                walk(child)
+
+        walk(self.root)
+        end = self.root.end if self.root.end is not None else time.perf_counter()
+        entries = [f"total;dur={(end - self.root.start) * 1000:.1f}"]
+        for name, seconds in totals.items():
+            entry = f"{name};dur={seconds * 1000:.1f}"
+            if counts[name] > 1:
+                entry += f';desc="x{counts[name]}"'
+            entries.append(entry)
+        return ", ".join(entries)
+
+def current_trace():
+    return _current_trace.get()
+
+def open_span(name, start):
+    """Start a child span of the current span; None (and no work) when the request is not traced"""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    span = Span(name, start)
+    (_current_span.get() or trace.root).children.append(span)
+    span._token = _current_span.set(span)
+    return span
+
+def close_span(span, end):
+    span.end = end
+    try:
+        _current_span.reset(span._token)
+    except ValueError:
+        pass  # Closed from another context (e.g. a generator finalized elsewhere)
+
+def annotate(**attrs):
+    """Attach payload sizes or other attributes to the current span of a traced request"""
+    trace = _current_trace.get()
+    if trace is not None:
+        (_current_span.get() or trace.root).attrs.update(attrs)
+
+@contextmanager
+def request_trace(enabled, profile=False):
+    """Trace the enclosed request when enabled, optionally under the sampling profiler"""
+    if not enabled:
+        yield None
+        return
+
+    trace = Trace()
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    profiler = None
+    if profile and TRACE_PROFILE_DIR and Profiler is not None and _take_profile_slot():
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+    try:
+        yield trace
+    finally:
+        trace.root.end = time.perf_counter()
+        if profiler is not None:
+            profiler.stop()
+            _write_profile(trace, profiler)
+        try:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+        except ValueError:
+            pass
+
+_profile_times = deque()
+
+def _take_profile_slot():
+    """Allow at most TRACE_PROFILES_PER_MINUTE profiles per worker, so profiling cannot fill the disk"""
+    now = time.monotonic()
+    while _profile_times and now - _profile_times[0] > 60:
+        _profile_times.popleft()
+    if len(_profile_times) >= TRACE_PROFILES_PER_MINUTE:
+        logger.warning("Profile limit reached - tracing the request without a profile")
+        return False
+    _profile_times.append(now)
+    return True
+
+def _write_profile(trace, profiler):
+    try:
+        os.makedirs(TRACE_PROFILE_DIR, exist_ok=True)
+        path = os.path.join(TRACE_PROFILE_DIR, f"{trace.id}.html")
+        with open(path, "w") as f:
+            f.write(profiler.output_html())
+        trace.root.attrs["profile"] = path
+        logger.info(f"Wrote profile for trace {trace.id} to {path}")
+    except Exception as e:
+        logger.warning(f"Error writing request profile: {str(e)}")
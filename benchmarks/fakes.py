@@ -0,0 +1,150 @@
+"""Local stand-ins for OpenAI, Pinecone and Redis, so the full request pipeline can be benchmarked offline."""
+import time
+import asyncio
+import zlib
+from typing import List
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from app.services.vector_backends import VectorBackend
+
+_WORDS = (
+    "the accused section court held that under code offence punishment appeal evidence "
+    "judgment provision act bail trial conviction petition order high supreme india"
+).split()
+
+def _seed(text):
+    return zlib.crc32(text.encode("utf-8"))
+
+class FakeChatModel(BaseChatModel):
+    """Chat model with a configurable time to first token and generation rate.
+
+    Streams `completion_tokens` word tokens and reports usage on the final chunk, like the OpenAI
+    API with stream usage enabled. Fusion rephrasing prompts get three short variants instead.
+    """
+
+    model_name: str = "gpt-4o-mini"
+    ttft: float = 0.3
+    tokens_per_second: float = 60.0
+    completion_tokens: int = 150
+
+    @property
+    def _llm_type(self):
+        return "benchmark-fake"
+
+    def _completion(self, messages):
+        prompt = "\n".join(str(message.content) for message in messages)
+        rng = np.random.default_rng(_seed(prompt))
+        if "rephrasings" in prompt:
+            return [f"{' '.join(rng.choice(_WORDS, 12))}?\n" for _ in range(3)], prompt
+        return [f"{word} " for word in rng.choice(_WORDS, self.completion_tokens)], prompt
+
+    def _usage(self, prompt, tokens):
+        prompt_tokens = len(prompt) // 4
+        return {"input_tokens": prompt_tokens, "output_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens, prompt = self._completion(messages)
+        time.sleep(self.ttft + len(tokens) / self.tokens_per_second)
+        message = AIMessage(content="".join(tokens), usage_metadata=self._usage(prompt, tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens, prompt = self._completion(messages)
+        await asyncio.sleep(self.ttft + len(tokens) / self.tokens_per_second)
+        message = AIMessage(content="".join(tokens), usage_metadata=self._usage(prompt, tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens, prompt = self._completion(messages)
+        await asyncio.sleep(self.ttft)
+        for token in tokens:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+            await asyncio.sleep(1 / self.tokens_per_second)
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt, tokens)))
+
+class FakeEmbeddings:
+    """Deterministic unit vectors per text, after a fixed request latency"""
+
+    def __init__(self, dimension=1536, latency=0.05):
+        self.dimension = dimension
+        self.latency = latency
+
+    def _vector(self, text):
+        vector = np.random.default_rng(_seed(text)).standard_normal(self.dimension).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    async def aembed_documents(self, texts: List[str]):
+        await asyncio.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_documents(self, texts: List[str]):
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+class FakeVectorBackend(VectorBackend):
+    """Blocking search with a fixed latency (like the Pinecone client) over synthetic judgments,
+    each cut into `chunks_per_judgment` neighbouring rows with similar vectors"""
+
+    name = "fake"
+
+    def __init__(self, latency=0.08, chunk_chars=1200, corpus_size=10000, chunks_per_judgment=4):
+        self.latency = latency
+        self.chunk_chars = chunk_chars
+        self.corpus_size = corpus_size
+        self.chunks_per_judgment = chunks_per_judgment
+
+    def _document(self, row):
+        judgment = row // self.chunks_per_judgment
+        rng = np.random.default_rng(row)
+        sentences = []
+        length = 0
+        while length < self.chunk_chars:
+            sentence = " ".join(rng.choice(_WORDS, 14)).capitalize() + "."
+            sentences.append(sentence)
+            length += len(sentence) + 1
+        return Document(
+            id=f"doc-{row}",
+            page_content=" ".join(sentences),
+            metadata={"title": f"Synthetic Judgment {judgment}", "url": f"https://example.org/doc/{judgment}/"}
+        )
+
+    def _vector(self, row, dimension):
+        judgment = row // self.chunks_per_judgment
+        base = np.random.default_rng(judgment).standard_normal(dimension)
+        vector = base + 0.3 * np.random.default_rng(row).standard_normal(dimension)
+        return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+    def _rows(self, embedding, k):
+        # Whole judgments come back together, so reranking has near-duplicates to remove
+        seed = _seed(np.asarray(embedding, dtype=np.float32)[:8].tobytes().hex())
+        judgments = self.corpus_size // self.chunks_per_judgment
+        first = np.random.default_rng(seed).choice(judgments, size=-(-k // self.chunks_per_judgment), replace=False)
+        rows = (first[:, None] * self.chunks_per_judgment + np.arange(self.chunks_per_judgment)).ravel()
+        return rows[:k]
+
+    def search(self, embedding, k):
+        time.sleep(self.latency)
+        rows = self._rows(embedding, k)
+        return [(self._document(int(row)), 0.9 - 0.01 * rank) for rank, row in enumerate(rows)]
+
+    def search_with_vectors(self, embedding, k):
+        time.sleep(self.latency)
+        rows = self._rows(embedding, k)
+        docs = [(self._document(int(row)), 0.9 - 0.01 * rank) for rank, row in enumerate(rows)]
+        return docs, np.stack([self._vector(int(row), len(embedding)) for row in rows])
+
+def fake_redis_clients():
+    """In-process Redis (text and binary clients sharing one server), via fakeredis"""
+    try:
+        import fakeredis
+    except ImportError:
+        raise SystemExit("The benchmarks need fakeredis for the in-process Redis: pip install fakeredis")
+
+    server = fakeredis.FakeServer()
+    return (
+        fakeredis.FakeAsyncRedis(server=server, decode_responses=True),
+        fakeredis.FakeAsyncRedis(server=server, decode_responses=False)
+    )
@@ -0,0 +1,284 @@
+"""Offline load benchmark of /query against local fakes for OpenAI, Pinecone and Redis.
+
+Requests go straight through the ASGI app (no sockets), so results measure this service's own
+overhead on top of the configured fake latencies.
+
+Usage:
+    python -m benchmarks.run_benchmark [--requests 200] [--concurrency 32] [--output results.json]
+                                       [--compare benchmarks/results/baseline.json]
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+import numpy as np
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")  # Clients are replaced by fakes, but must construct
+
+from app.main import app
+from app.services.llm_service import llm_service
+from app.services.redis_service import redis_service
+from app.services.vector_service import vector_service
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings, FakeVectorBackend, fake_redis_clients
+
+logger = logging.getLogger("NyayaGPT-API")
+
+QUERY_TEMPLATES = [
+    "What is the punishment for cheating under the Indian Penal Code in matter {n}?",
+    "Explain the grounds for anticipatory bail considered by courts in case {n}",
+    "What are the essential ingredients of criminal breach of trust for dispute {n}?",
+    "How do courts decide maintenance claims by a wife under the CrPC in petition {n}?",
+    "When can a High Court quash an FIR under its inherent powers in proceeding {n}?",
+]
+
+def install_fakes(ttft=0.3, tokens_per_second=60.0, completion_tokens=150, embedding_latency=0.05,
+                  vector_latency=0.08):
+    """Swap every external dependency of the pipeline for its local stand-in"""
+    for model_name in llm_service.models:
+        for streaming in (False, True):
+            llm_service._clients[(model_name, streaming)] = FakeChatModel(
+                model_name=model_name,
+                ttft=ttft,
+                tokens_per_second=tokens_per_second,
+                completion_tokens=completion_tokens
+            )
+    vector_service.init_vector_store(
+        backend=FakeVectorBackend(latency=vector_latency),
+        embeddings=FakeEmbeddings(latency=embedding_latency)
+    )
+    redis_service.client, redis_service.binary_client = fake_redis_clients()
+    redis_service.write_behind.start()
+
+async def asgi_post(path, payload, headers=(), client=("127.0.0.1", 50000)):
+    """POST JSON through the ASGI app, timestamping every body chunk as it is sent"""
+    body = json.dumps(payload).encode("utf-8")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"benchmark"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode())
+        ] + [(name.lower().encode(), value.encode()) for name, value in headers],
+        "client": client,
+        "server": ("benchmark", 80)
+    }
+    request_sent = False
+    finished = asyncio.Event()
+    response = {"status": None, "chunks": []}
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            if chunk:
+                response["chunks"].append((time.perf_counter(), chunk))
+            if not message.get("more_body", False):
+                finished.set()
+
+    await app(scope, receive, send)
+    return response
+
+def client_address(n):
+    """A distinct peer address per request: one shared client bucket would otherwise throttle the run"""
+    return (f"10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}", 50000)
+
+async def run_request(payload, stream_protocol, client):
+    start = time.perf_counter()
+    headers = []
+    if payload["stream"]:
+        headers.append(("X-Stream-Protocol", str(stream_protocol)))
+    response = await asgi_post("/query", payload, headers, client=client)
+    end = time.perf_counter()
+
+    ttft = None
+    if payload["stream"]:
+        for sent_at, chunk in response["chunks"]:
+            if b'"delta"' in chunk or b'"chunk"' in chunk:
+                ttft = sent_at - start
+                break
+    return {
+        "ok": response["status"] == 200 and b'"error"' not in b"".join(c for _, c in response["chunks"]),
+        "latency": end - start,
+        "ttft": ttft,
+        "bytes": sum(len(chunk) for _, chunk in response["chunks"])
+    }
+
+async def monitor_loop_lag(samples, stop, interval=0.01):
+    """Record how late the event loop wakes a sleeping task"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - start - interval))
+
+def percentiles(values, scale=1000.0):
+    if not values:
+        return None
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50": round(p50 * scale, 2),
+        "p95": round(p95 * scale, 2),
+        "p99": round(p99 * scale, 2),
+        "max": round(max(values) * scale, 2),
+        "mean": round(float(np.mean(values)) * scale, 2)
+    }
+
+async def run_scenario(name, stream, strategy, args, offset):
+    """Fire args.requests unique queries at args.concurrency and summarize them"""
+    def payload(n):
+        return {
+            "query": QUERY_TEMPLATES[n % len(QUERY_TEMPLATES)].format(n=n),
+            "model_name": args.model,
+            "strategy": strategy,
+            "stream": stream,
+            "max_tokens": args.completion_tokens
+        }
+
+    for n in range(args.warmup):
+        await run_request(payload(offset + n), args.stream_protocol, client_address(offset + n))
+    offset += args.warmup
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    lag_samples = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(monitor_loop_lag(lag_samples, stop))
+
+    async def bounded(n):
+        async with semaphore:
+            return await run_request(payload(offset + n), args.stream_protocol, client_address(offset + n))
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(bounded(n) for n in range(args.requests)))
+    wall = time.perf_counter() - start
+    stop.set()
+    await lag_task
+
+    ok = [result for result in results if result["ok"]]
+    summary = {
+        "scenario": name,
+        "stream": stream,
+        "strategy": strategy,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(len(results) / wall, 2),
+        "latency_ms": percentiles([result["latency"] for result in ok]),
+        "ttft_ms": percentiles([result["ttft"] for result in ok if result["ttft"] is not None]),
+        "response_bytes": percentiles([result["bytes"] for result in ok], scale=1.0),
+        "loop_lag_ms": percentiles(lag_samples)
+    }
+    return summary, offset + args.requests
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+def compare(results, baseline_path):
+    """Print p50/p95 latency, TTFT and throughput changes against a previous results file"""
+    with open(baseline_path) as f:
+        baseline = {scenario["scenario"]: scenario for scenario in json.load(f)["scenarios"]}
+
+    def change(new, old):
+        return f"{new:>9.2f} ({(new - old) / old * 100:+.1f}%)" if old else f"{new:>9.2f}"
+
+    print(f"\nCompared with {baseline_path}:")
+    for scenario in results["scenarios"]:
+        old = baseline.get(scenario["scenario"])
+        if not old:
+            continue
+        print(f"  {scenario['scenario']}")
+        print(f"    req/s        {change(scenario['requests_per_second'], old['requests_per_second'])}")
+        for metric in ("latency_ms", "ttft_ms"):
+            if scenario[metric] and old.get(metric):
+                for p in ("p50", "p95"):
+                    print(f"    {metric} {p:<4}{change(scenario[metric][p], old[metric][p])}")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark /query offline against local fakes")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests per scenario")
+    parser.add_argument("--scenarios", default="json-simple,json-fusion,stream-simple,stream-fusion")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--stream-protocol", type=int, default=2)
+    parser.add_argument("--ttft", type=float, default=0.3, help="Fake LLM time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--completion-tokens", type=int, default=150)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--vector-latency", type=float, default=0.08)
+    parser.add_argument("--output", help="Results file (default benchmarks/results/<timestamp>-<commit>.json)")
+    parser.add_argument("--compare", help="Previous results file to diff against")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(args.log_level)
+    logger.setLevel(args.log_level)
+    install_fakes(
+        ttft=args.ttft,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        embedding_latency=args.embedding_latency,
+        vector_latency=args.vector_latency
+    )
+
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "log_level")},
+        "scenarios": []
+    }
+
+    offset = 0
+    for name in args.scenarios.split(","):
+        mode, strategy = name.split("-", 1)
+        summary, offset = await run_scenario(name, mode == "stream", strategy, args, offset)
+        results["scenarios"].append(summary)
+        latency, ttft = summary["latency_ms"] or {}, summary["ttft_ms"] or {}
+        print(
+            f"{name:<15} {summary['requests_per_second']:>8.2f} req/s  "
+            f"p50 {latency.get('p50', 0):>8.1f} ms  p95 {latency.get('p95', 0):>8.1f} ms  "
+            f"p99 {latency.get('p99', 0):>8.1f} ms  ttft p50 {ttft.get('p50', 0):>7.1f} ms  "
+            f"errors {summary['errors']}"
+        )
+
+    await redis_service.write_behind.drain()
+    vector_service.close()
+
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"{datetime.now():%Y%m%d-%H%M%S}-{commit or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+"""Startup-time benchmark: cold `import app.main` in fresh interpreters, then the lifespan warm-up
+against the local fakes.
+
+Usage:
+    python -m benchmarks.startup [--runs 5] [--top 15] [--output results.json]
+                                 [--compare benchmarks/results/startup-baseline.json]
+"""
+import os
+import re
+import sys
+import json
+import asyncio
+import logging
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+import numpy as np
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("LLM_PREWARM_CONNECTIONS", "0")  # No provider to connect to offline
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import app.main; print(time.perf_counter() - start)"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)$")
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+def measure_imports(runs, top):
+    """Wall time of `import app.main` in fresh interpreters, plus the slowest top-level packages"""
+    seconds = []
+    packages = {}
+    for run in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", IMPORT_SNIPPET],
+            capture_output=True, text=True, env=os.environ.copy(), check=True
+        )
+        seconds.append(float(completed.stdout.strip().splitlines()[-1]))
+        if run == 0:
+            for line in completed.stderr.splitlines():
+                match = IMPORTTIME_LINE.match(line)
+                if match and "." not in match.group(4):
+                    name = match.group(4)
+                    packages[name] = max(packages.get(name, 0), int(match.group(2)))
+
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "runs": runs,
+        "median_ms": round(float(np.median(seconds)) * 1000, 1),
+        "min_ms": round(min(seconds) * 1000, 1),
+        "max_ms": round(max(seconds) * 1000, 1),
+        "slowest_packages_ms": {name: round(us / 1000, 1) for name, us in slowest}
+    }
+
+async def measure_warmup(args):
+    """Run the lifespan warm-up stages against the fakes and time each of them"""
+    from benchmarks.run_benchmark import install_fakes
+    from app.services.redis_service import redis_service
+    from app.services.vector_service import vector_service
+    from app.services.warmup import warmup
+
+    install_fakes(embedding_latency=args.embedding_latency, vector_latency=args.vector_latency)
+    await warmup.run()
+    await redis_service.write_behind.drain()
+    vector_service.close()
+    return {"total_ms": round(warmup.duration * 1000, 1), "stages": warmup.stages}
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    def change(new, old):
+        return f"{new:>9.1f} ms ({(new - old) / old * 100:+.1f}%)" if old else f"{new:>9.1f} ms"
+
+    print(f"\nCompared with {baseline_path}:")
+    print(f"  import median {change(results['import']['median_ms'], baseline['import']['median_ms'])}")
+    print(f"  warm-up total {change(results['warmup']['total_ms'], baseline['warmup']['total_ms'])}")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark import and warm-up time")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time the import in")
+    parser.add_argument("--top", type=int, default=15, help="Slowest top-level packages to report")
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--vector-latency", type=float, default=0.08)
+    parser.add_argument("--output", help="Results file (default benchmarks/results/startup-<timestamp>-<commit>.json)")
+    parser.add_argument("--compare", help="Previous results file to diff against")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(args.log_level)
+    logging.getLogger("NyayaGPT-API").setLevel(args.log_level)
+
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "import": measure_imports(args.runs, args.top)
+    }
+    print(f"import app.main  median {results['import']['median_ms']:.1f} ms "
+          f"(min {results['import']['min_ms']:.1f}, max {results['import']['max_ms']:.1f}, {args.runs} runs)")
+    for name, ms in results["import"]["slowest_packages_ms"].items():
+        print(f"  {name:<30} {ms:>8.1f} ms")
+
+    results["warmup"] = await measure_warmup(args)
+    print(f"warm-up          total  {results['warmup']['total_ms']:.1f} ms")
+    for name, stage in results["warmup"]["stages"].items():
+        print(f"  {name:<30} {stage['seconds'] * 1000:>8.1f} ms  {stage['status']}")
+
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"startup-{datetime.now():%Y%m%d-%H%M%S}-{commit or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+"""Export the Pinecone judgements index into a local snapshot for VECTOR_BACKEND=local.
+
+Usage:
+    python -m scripts.export_pinecone_snapshot [--output data/judgements-index] [--namespace NS]
+"""
+import argparse
+import logging
+from pinecone import Pinecone
+from app.config import PINECONE_API_KEY, PINECONE_INDEX_NAME, EMBEDDING_MODEL, LOCAL_INDEX_PATH
+from app.services.vector_backends import write_snapshot
+
+logger = logging.getLogger("NyayaGPT-API")
+
+def iter_records(index, namespace, batch_size, text_key="text"):
+    """Page through every vector id and fetch values + metadata in batches"""
+    for ids in index.list(namespace=namespace, limit=batch_size):
+        fetched = index.fetch(ids=list(ids), namespace=namespace)
+        for record_id, vector in fetched.vectors.items():
+            metadata = dict(vector.metadata or {})
+            text = metadata.pop(text_key, "")
+            yield record_id, vector.values, text, metadata
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a Pinecone index to a local memory-mapped snapshot")
+    parser.add_argument("--index", default=PINECONE_INDEX_NAME)
+    parser.add_argument("--output", default=LOCAL_INDEX_PATH)
+    parser.add_argument("--namespace", default="")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    pc = Pinecone(api_key=PINECONE_API_KEY)
+    index = pc.Index(args.index)
+    dimension = index.describe_index_stats()["dimension"]
+
+    count = write_snapshot(
+        args.output,
+        index_name=args.index,
+        embedding_model=EMBEDDING_MODEL,
+        dimension=dimension,
+        records=iter_records(index, args.namespace, args.batch_size)
+    )
+    logger.info(f"Exported {count} vectors from '{args.index}' to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import pytest
+
+from app.services.citation_index import is_citation_query, provision_signature
+
+@pytest.mark.parametrize("query", [
+    "What is Section 420 IPC?",
+    "s.420 ipc",
+    "bail u/s 498a",
+    "Article 21 right to privacy",
+    "Kesavananda Bharati v. State of Kerala",
+    "maneka gandhi v union of india",
+    "Arnesh Kumar vs State of Bihar",
+    "Vishaka v Rajasthan"
+])
+def test_citation_queries(query):
+    assert is_citation_query(query)
+
+@pytest.mark.parametrize("query", [
+    "difference between murder vs culpable homicide",
+    "bail vs anticipatory bail",
+    "it's 5 years since the FIR, what can I do?",
+    "what is the punishment for cheating"
+])
+def test_ordinary_questions_are_not_citation_queries(query):
+    assert not is_citation_query(query)
+
+def test_provision_signature_normalizes_provisions_and_ignores_contractions():
+    assert provision_signature("section 420 IPC") == provision_signature("s.420 of the ipc") == ["sec:420"]
+    assert provision_signature("it's 5 years") == ["5"]
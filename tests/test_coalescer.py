@@ -0,0 +1,113 @@
+import json
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.services import coalescer
+from app.services.coalescer import Flight, FlightAbandoned, LocalFollower, RemoteFollower, RequestCoalescer
+from app.services.redis_service import redis_service
+
+RESULT = {"response": "Hello world", "metadata": {"conversation_id": "leader"}, "context_sources": []}
+
+def run(coro):
+    return asyncio.run(coro)
+
+async def drain(follower):
+    return [chunk async for chunk in follower.chunks()]
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(redis_service, "client", client)
+    monkeypatch.setattr(coalescer, "SINGLE_FLIGHT_RELAY_INTERVAL", 0.01)
+    return client
+
+def test_local_follower_replays_chunks_published_before_it_joined():
+    async def scenario():
+        flight = Flight("key")
+        flight.publish("Hello ")
+        follower = LocalFollower(flight)
+        task = asyncio.create_task(drain(follower))
+        await asyncio.sleep(0)
+        flight.publish("world")
+        flight.finish(RESULT)
+        return await task, await follower.result()
+
+    chunks, result = run(scenario())
+    assert chunks == ["Hello ", "world"]
+    assert result == RESULT
+
+def test_local_follower_gets_none_when_leader_fails():
+    async def scenario():
+        worker = RequestCoalescer()
+        flight, _ = await worker.join("key")
+        _, follower = await worker.join("key")
+        flight.publish("partial")
+        worker.release(flight)  # Leader ended without finishing
+        with pytest.raises(FlightAbandoned):
+            await drain(follower)
+        return await follower.result(), worker.stats()
+
+    result, stats = run(scenario())
+    assert result is None
+    assert stats == {"in_flight": 0, "leaders": 1, "followers": 1}
+
+def test_remote_follower_skips_text_already_in_the_buffered_prefix(fake_redis):
+    async def scenario():
+        await fake_redis.set(coalescer._lock_key("key"), "worker-1")
+        await fake_redis.set(coalescer._buffer_key("key"), "Hello wor")
+        follower = RemoteFollower("key")
+        chunks = follower.chunks()
+        first = await chunks.__anext__()  # Subscribed and read the prefix
+
+        channel = coalescer._channel("key")
+        await fake_redis.publish(channel, json.dumps({"offset": 0, "chunk": "Hello "}))
+        await fake_redis.publish(channel, json.dumps({"offset": 6, "chunk": "world"}))
+        await fake_redis.publish(channel, json.dumps({"offset": 11, "chunk": "!"}))
+        await fake_redis.publish(channel, json.dumps({"done": RESULT}))
+        rest = [chunk async for chunk in chunks]
+        return [first] + rest, follower.final, await fake_redis.get(coalescer._subs_key("key"))
+
+    chunks, final, subscribers = run(scenario())
+    assert chunks == ["Hello wor", "ld", "!"]
+    assert final == RESULT
+    assert subscribers == "1"
+
+def test_remote_follower_receives_relayed_stream(fake_redis):
+    async def scenario():
+        leader_worker, follower_worker = RequestCoalescer(), RequestCoalescer()
+        flight, _ = await leader_worker.join("key")
+        _, follower = await follower_worker.join("key")
+        assert isinstance(follower, RemoteFollower)
+
+        task = asyncio.create_task(drain(follower))
+        while not await fake_redis.get(coalescer._subs_key("key")):
+            await asyncio.sleep(0.01)
+        for chunk in ("Hello ", "world"):
+            flight.publish(chunk)
+            await asyncio.sleep(0.05)
+        flight.finish(RESULT)
+        chunks = await task
+        await flight._relay_task
+        leader_worker.release(flight)
+        return chunks, follower.final, await fake_redis.keys("inflight:*")
+
+    chunks, final, leftover = run(scenario())
+    assert "".join(chunks) == "Hello world"
+    assert final == RESULT
+    assert leftover == []
+
+def test_unfollowed_leader_relays_nothing_but_the_final_event(fake_redis):
+    async def scenario():
+        flight, _ = await RequestCoalescer().join("key")
+        flight.publish("Hello ")
+        await asyncio.sleep(0.05)
+        buffered = await fake_redis.get(coalescer._buffer_key("key"))
+        flight.finish(RESULT)
+        await flight._relay_task
+        return buffered, await fake_redis.keys("inflight:*")
+
+    buffered, leftover = run(scenario())
+    assert buffered is None
+    assert leftover == []
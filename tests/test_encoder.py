@@ -0,0 +1,30 @@
+import sys
+import types
+
+from app.utils import helpers
+
+def test_failed_tokenizer_load_is_retried_after_backoff(monkeypatch):
+    attempts = []
+    clock = [1000.0]
+
+    def get_encoding(name):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise OSError("BPE download failed")
+        return object()
+
+    fake_tiktoken = types.SimpleNamespace(encoding_name_for_model=lambda model: "cl100k_base", get_encoding=get_encoding)
+    monkeypatch.setitem(sys.modules, "tiktoken", fake_tiktoken)
+    monkeypatch.setattr(helpers, "_encoders", {})
+    monkeypatch.setattr(helpers, "_encoder_failures", {})
+    monkeypatch.setattr(helpers.time, "monotonic", lambda: clock[0])
+
+    assert helpers.get_encoder("test-model") is None
+    assert helpers.get_encoder("test-model") is None  # Backing off: no second attempt yet
+    assert len(attempts) == 1
+
+    clock[0] += helpers._ENCODER_RETRY_MIN
+    encoder = helpers.get_encoder("test-model")
+    assert encoder is not None
+    assert helpers.get_encoder("test-model") is encoder  # Cached once loaded
+    assert len(attempts) == 2
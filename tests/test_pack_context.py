@@ -0,0 +1,43 @@
+from langchain_core.documents import Document
+
+from app.utils.helpers import count_tokens, pack_context
+
+SENTENCES = [
+    "Section 420 of the Indian Penal Code deals with cheating.",
+    "It covers dishonestly inducing the delivery of property.",
+    "The punishment may extend to seven years of imprisonment."
+]
+
+def make_doc(text, title="State v. Kumar", url="https://example.org/state-v-kumar"):
+    return Document(page_content=text, metadata={"title": title, "url": url})
+
+def test_chunk_that_fits_is_kept_whole():
+    context = pack_context([make_doc(" ".join(SENTENCES))], budget_tokens=1000)
+
+    assert context.endswith(SENTENCES[-1])
+    assert "..." not in context
+    for sentence in SENTENCES:
+        assert sentence in context
+
+def test_exact_duplicate_is_packed_once():
+    doc = make_doc(" ".join(SENTENCES))
+    context = pack_context([doc, doc], budget_tokens=1000)
+
+    assert context.count("### ") == 1
+    assert context.count(SENTENCES[0]) == 1
+
+def test_overlong_sentence_is_cut_within_budget():
+    sentence = "The appellant " + " ".join(["argued at considerable length"] * 400) + "."
+    context = pack_context([make_doc(sentence)], budget_tokens=200)
+
+    assert context.startswith("### State v. Kumar")
+    assert context.endswith(" ...")
+    assert count_tokens(context) <= 200
+
+def test_cut_chunk_stays_within_budget():
+    text = " ".join(f"Sentence number {i} of the judgment is here." for i in range(100))
+    context = pack_context([make_doc(text)], budget_tokens=120)
+
+    assert context.endswith(" ...")
+    assert "Sentence number 0 " in context
+    assert count_tokens(context) <= 120